@@ -0,0 +1,161 @@
+"""
+Benchmarks for django_zsutils. Every module in this package offers a
+``cases()`` function returning a list of ``Case`` objects, which are timed
+by ``measure``. Use ``run.py`` to execute them::
+
+    python benchmarks/run.py                    # run all suites
+    python benchmarks/run.py ctn                # run only the ctn suite
+    python benchmarks/run.py --save-baseline    # store the results
+    python benchmarks/run.py --output out.json  # write the results as JSON
+
+The suites cover the content type negotiation (ctn), the view wrapper
+(oopviews), the generic relations (generic), the pagination tag
+(pagination), the tag links (taghelpers), the flash messages (flash) and
+the datetime formatting (dateformat). They run against an in-memory SQLite
+database set up by the runner.
+
+If a baseline file exists, every run is compared against it and the runner
+exits with a non-zero status if a case got slower than the configured
+tolerance allows. Besides the throughput and latencies, the results contain
+the peak resident memory of the process after every case and how much it
+grew during the case. The runner starts a new process for every suite, so
+the peak is the one of the subsystem the suite covers. Within a suite the
+peak only ever grows, so the growth of a case depends on the cases before
+it. The memory numbers are reported, but not compared.
+
+Every case prepares what it needs in its ``setup`` and restores the global
+state (settings, database rows) in its ``teardown``, so the cases don't
+depend on each other.
+"""
+
+import os
+from timeit import default_timer
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    import json
+except ImportError:
+    from django.utils import simplejson as json
+
+__all__ = ('Case', 'measure', 'load_baseline', 'save_baseline', 'compare',
+    'DEFAULT_BASELINE', )
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+class Case(object):
+    """
+    A single benchmark: ``func`` is called once for every element of
+    ``inputs`` per round and ``number`` times in a row for each of them.
+    ``setup`` is called once before the case gets timed and ``teardown``
+    once afterwards.
+    """
+
+    def __init__(self, name, func, inputs=(None,), number=100, setup=None,
+            teardown=None):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.number = number
+        self.setup = setup
+        self.teardown = teardown
+
+def percentile(values, fraction):
+    """
+    Returns the value at the given fraction of the already sorted list
+    ``values`` (nearest-rank method).
+    """
+    if not values:
+        return 0.0
+    index = int(round(fraction * (len(values) - 1)))
+    return values[index]
+
+def max_rss():
+    """
+    Returns the peak resident memory of the process in kilobytes (or None
+    if the platform doesn't tell).
+    """
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def measure(case, rounds=10):
+    """
+    Times the given case and returns a dictionary with the number of calls
+    per second, the 50th, 90th and 99th percentile of the per-call latency
+    in microseconds and the peak memory after the case and its growth in
+    kilobytes.
+    """
+    if case.setup is not None:
+        case.setup()
+    try:
+        rss_before = max_rss()
+        func = case.func
+        number = case.number
+        loop = range(number)
+        samples = []
+        total = 0.0
+        for round_ in range(rounds):
+            for value in case.inputs:
+                start = default_timer()
+                for i in loop:
+                    func(value)
+                elapsed = default_timer() - start
+                total += elapsed
+                samples.append(elapsed / number)
+    finally:
+        if case.teardown is not None:
+            case.teardown()
+    samples.sort()
+    calls = rounds * len(case.inputs) * number
+    rss_after = max_rss()
+    rss_growth = None
+    if rss_after is not None:
+        rss_growth = rss_after - rss_before
+    return {
+        'calls': calls,
+        'ops_per_sec': total and calls / total or 0.0,
+        'p50_us': percentile(samples, 0.5) * 1e6,
+        'p90_us': percentile(samples, 0.9) * 1e6,
+        'p99_us': percentile(samples, 0.99) * 1e6,
+        'max_rss_kb': rss_after,
+        'max_rss_growth_kb': rss_growth,
+    }
+
+def load_baseline(path=DEFAULT_BASELINE):
+    """
+    Returns the results stored in the baseline file or None if there is no
+    such file.
+    """
+    if not os.path.exists(path):
+        return None
+    fp = open(path)
+    try:
+        return json.load(fp)
+    finally:
+        fp.close()
+
+def save_baseline(results, path=DEFAULT_BASELINE):
+    fp = open(path, 'w')
+    try:
+        json.dump(results, fp, indent=2, sort_keys=True)
+    finally:
+        fp.close()
+
+def compare(results, baseline, tolerance=0.2):
+    """
+    Compares the throughput of every case against the baseline and returns
+    a list of ``(name, baseline_ops, current_ops)`` tuples for all the cases
+    that got slower by more than ``tolerance``.
+    """
+    regressions = []
+    for name, result in sorted(results.items()):
+        if name not in baseline:
+            continue
+        expected = baseline[name]['ops_per_sec']
+        if result['ops_per_sec'] < expected * (1 - tolerance):
+            regressions.append((name, expected, result['ops_per_sec']))
+    return regressions
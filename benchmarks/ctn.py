@@ -0,0 +1,107 @@
+"""
+Benchmarks for the content type negotiation in
+``django_zsutils.utils.oopviews.ctn``: parsing "Accept"-headers, compiling
+the handler bindings and dispatching complete requests.
+"""
+
+from django.http import HttpResponse
+
+from django_zsutils.utils.lru import LRUCache
+from django_zsutils.utils.oopviews import create_view, ctn
+from tests import utils
+
+from . import Case
+
+BROWSER_HEADERS = [
+    # Firefox
+    'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    # Chrome
+    'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,'
+    'image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
+    # Safari
+    'application/xml,application/xhtml+xml,text/html;q=0.9,'
+    'text/plain;q=0.8,image/png,*/*;q=0.5',
+    # Internet Explorer
+    'image/gif, image/jpeg, image/pjpeg, application/x-ms-application, '
+    'application/xaml+xml, application/x-ms-xbap, */*',
+]
+
+API_HEADERS = [
+    'application/json',
+    'application/json, text/javascript, */*; q=0.01',
+    'application/xml',
+    'text/plain',
+    '*/*',
+]
+
+LONG_HEADERS = [
+    ', '.join(['application/x-vendor-%d;q=0.%d' % (i, i % 10)
+        for i in range(40)] + ['text/*;q=0.1']),
+    ', '.join(['text/x-type-%d;level=%d;q=0.%d' % (i, i, (i % 9) + 1)
+        for i in range(60)] + ['*/*;q=0.01']),
+]
+
+MALFORMED_HEADERS = [
+    '',
+    ',,,',
+    'text',
+    'text/html;q=',
+    'text/html;q=high, application/json;q=0.5',
+    'text/html;q=5',
+    ';;;q=0.5',
+    '/',
+]
+
+CORPUS = BROWSER_HEADERS + API_HEADERS + LONG_HEADERS + MALFORMED_HEADERS
+
+class BenchmarkView(ctn.AbstractCTNView):
+    ctn_accept_binding = {
+        'text/html': 'html',
+        'application/xhtml+xml': 'html',
+        'application/json': (0.9, 'json'),
+        'application/xml': (0.8, 'xml'),
+        'text/plain': (0.5, 'text'),
+        'text/*': 'text',
+        '*/*': 'html',
+    }
+
+    def html(self, request, *args, **kwargs):
+        return HttpResponse('html')
+
+    def json(self, request, *args, **kwargs):
+        return HttpResponse('json')
+
+    def xml(self, request, *args, **kwargs):
+        return HttpResponse('xml')
+
+    def text(self, request, *args, **kwargs):
+        return HttpResponse('text')
+
+def _requests():
+    factory = utils.RequestFactory()
+    return [factory.get('/', HTTP_ACCEPT=header) for header in CORPUS]
+
+def _use_cache(maxsize):
+    """
+    Returns the ``setup`` and ``teardown`` of a case using an accept cache
+    of the given size and restoring the previous one afterwards.
+    """
+    saved = []
+    def _setup():
+        saved.append(ctn._accept_cache)
+        ctn._accept_cache = LRUCache(maxsize)
+    def _teardown():
+        ctn._accept_cache = saved.pop()
+    return {'setup': _setup, 'teardown': _teardown}
+
+def cases():
+    view = create_view(BenchmarkView)
+    requests = _requests()
+    return [
+        Case('parse_accept_header', ctn.parse_accept_header, CORPUS),
+        Case('provides_priorities',
+            lambda binding: ctn.CTNDispatchTable(binding),
+            [BenchmarkView.ctn_accept_binding]),
+        Case('dispatch_uncached', view, requests, **_use_cache(0)),
+        Case('dispatch_cached', view, requests, **_use_cache(256)),
+    ]
@@ -0,0 +1,46 @@
+"""
+Benchmarks for ``django_zsutils.utils.dateformat``: formatting a column of
+1000 datetimes with Django's ``dateformat.format``, the precompiled
+``format`` and the bulk ``format_many``.
+"""
+
+import datetime
+
+from django.conf import settings
+from django.utils import dateformat as django_dateformat
+
+from django_zsutils.utils import dateformat
+
+from . import Case
+
+VALUES = [datetime.datetime(2011, 1, 1) + datetime.timedelta(minutes=97 * i)
+    for i in range(1000)]
+
+def _django_format(format_string):
+    def _format(value):
+        for v in VALUES:
+            django_dateformat.format(v, format_string)
+    return _format
+
+def _compiled_format(format_string):
+    def _format(value):
+        for v in VALUES:
+            dateformat.format(v, format_string)
+    return _format
+
+def _format_many(format_string):
+    def _format(value):
+        dateformat.format_many(VALUES, format_string)
+    return _format
+
+def cases():
+    result = []
+    for (name, format_string) in (('default', settings.DATETIME_FORMAT),
+            ('timezone', 'Y-m-d H:i:s O')):
+        result.extend([
+            Case('django_%s' % name, _django_format(format_string), number=2),
+            Case('compiled_%s' % name, _compiled_format(format_string),
+                number=2),
+            Case('many_%s' % name, _format_many(format_string), number=2),
+        ])
+    return result
@@ -0,0 +1,74 @@
+"""
+Benchmarks for ``django_zsutils.utils.flash``: a request adding two
+messages followed by one showing them through the context processor, with
+the session and the cookie storage, and a request not using the flash at
+all.
+"""
+
+from django.conf import settings
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.http import HttpResponse
+
+from django_zsutils.utils import flash
+from tests import utils
+
+from . import Case
+
+def _set_storage(path):
+    if path is not None:
+        settings.FLASH_STORAGE = path
+    elif hasattr(settings, 'FLASH_STORAGE'):
+        del settings.FLASH_STORAGE
+    flash._storage_class = None
+
+def _use_storage(path=None):
+    """
+    Returns the ``setup`` and ``teardown`` of a case using the given storage
+    backend (or the default one) and restoring the previous one afterwards.
+    """
+    saved = []
+    def _setup():
+        saved.append(getattr(settings, 'FLASH_STORAGE', None))
+        _set_storage(path)
+    def _teardown():
+        _set_storage(saved.pop())
+    return {'setup': _setup, 'teardown': _teardown}
+
+def _process(cookies):
+    request = utils.RequestFactory().get('/')
+    request.COOKIES.update(cookies)
+    middlewares = (SessionMiddleware(), flash.Middleware())
+    for middleware in middlewares:
+        middleware.process_request(request)
+    return (request, middlewares)
+
+def _respond(request, middlewares):
+    response = HttpResponse()
+    for middleware in reversed(middlewares):
+        response = middleware.process_response(request, response)
+    return dict([(name, cookie.value)
+        for (name, cookie) in response.cookies.items()])
+
+def _round_trip(value):
+    (request, middlewares) = _process({})
+    request.flash.add_success('The article has been saved.')
+    request.flash.add_warning('It will be published tomorrow.')
+    cookies = _respond(request, middlewares)
+    (request, middlewares) = _process(cookies)
+    [message['msg'] for message in flash.context_processor(request)['flash']]
+    _respond(request, middlewares)
+
+def _unused(value):
+    (request, middlewares) = _process({})
+    flash.context_processor(request)
+    _respond(request, middlewares)
+
+def cases():
+    return [
+        Case('round_trip_session', _round_trip, number=20, **_use_storage(
+            'django_zsutils.utils.flash.storage.SessionStorage')),
+        Case('round_trip_cookie', _round_trip, number=20, **_use_storage(
+            'django_zsutils.utils.flash.storage.CookieStorage')),
+        # With the default storage
+        Case('unused', _unused, number=20, **_use_storage()),
+    ]
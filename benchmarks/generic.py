@@ -0,0 +1,51 @@
+"""
+Benchmarks for ``GFKManager.relate`` in ``django_zsutils.utils.generic``:
+binding the content objects of n generic items pointing at objects of m
+content types, compared to the 1+n queries of accessing them one by one.
+"""
+
+from tests.models import Article, Photo, Entry, Activity
+
+from . import Case
+
+MODELS = (Article, Photo, Entry)
+
+def _clear():
+    for model in (Activity, ) + MODELS:
+        model.objects.all().delete()
+
+def _populate(rows, content_types):
+    def _setup():
+        _clear()
+        models = MODELS[:content_types]
+        for i in range(rows):
+            obj = models[i % len(models)].objects.create(title='Object %d' % i)
+            Activity.objects.create(content_object=obj)
+    return _setup
+
+def _unrelated(value):
+    for item in Activity.objects.all():
+        item.content_object.title
+
+def _relate(value):
+    for item in Activity.objects.relate(Activity.objects.all()):
+        item.content_object.title
+
+def _relate_iterator(value):
+    for item in Activity.objects.relate_iterator(Activity.objects.all(),
+            chunk_size=250):
+        item.content_object.title
+
+def cases():
+    return [
+        Case('unrelated_n100_m3', _unrelated, number=2,
+            setup=_populate(100, 3), teardown=_clear),
+        Case('relate_n100_m1', _relate, number=5, setup=_populate(100, 1),
+            teardown=_clear),
+        Case('relate_n100_m3', _relate, number=5, setup=_populate(100, 3),
+            teardown=_clear),
+        Case('relate_n1000_m3', _relate, number=1, setup=_populate(1000, 3),
+            teardown=_clear),
+        Case('relate_iterator_n1000_m3', _relate_iterator, number=1,
+            setup=_populate(1000, 3), teardown=_clear),
+    ]
@@ -0,0 +1,90 @@
+"""
+Benchmarks for ``django_zsutils.utils.oopviews.create_view``: the overhead
+of the view wrapper with and without the timing instrumentation compared to
+calling the view class directly, and a view with class-level setup done per
+request, once in ``__setup__`` and with a shared stateless instance.
+"""
+
+from django.http import HttpResponse
+from django.template import Context, Template
+
+from django_zsutils.utils.oopviews import create_view, BaseView
+from django_zsutils.utils.oopviews import instrumentation
+from tests import utils
+
+from . import Case
+
+class BenchmarkView(BaseView):
+    def __call__(self, request, *args, **kwargs):
+        return HttpResponse('view')
+
+class StatelessBenchmarkView(BenchmarkView):
+    stateless = True
+
+TEMPLATE = '''<ul>{% for item in items %}
+<li class="{% cycle 'odd' 'even' %}">{{ item|title }}</li>{% endfor %}
+</ul>{% if footer %}<p>{{ footer }}</p>{% endif %}'''
+
+class PerRequestSetupView(BaseView):
+    def __init__(self, request, *args, **kwargs):
+        self.template = Template(TEMPLATE)
+
+    def __call__(self, request, *args, **kwargs):
+        return HttpResponse(self.template.render(Context({
+            'items': ['a', 'b', 'c'], 'footer': 'end'})))
+
+class ClassSetupView(PerRequestSetupView):
+    def __setup__(cls):
+        cls.template = Template(TEMPLATE)
+    __setup__ = classmethod(__setup__)
+
+    def __init__(self, request, *args, **kwargs):
+        pass
+
+class StatelessSetupView(ClassSetupView):
+    stateless = True
+
+def _direct(request):
+    view = BenchmarkView(request)
+    return view.__after__(view(request))
+
+def _instrumentation(enabled):
+    """
+    Returns the ``setup`` and ``teardown`` of a case with the
+    instrumentation enabled or disabled, restoring the previous state
+    afterwards.
+    """
+    saved = []
+    def _setup():
+        saved.append(instrumentation.is_enabled())
+        instrumentation.collector.reset()
+        if enabled:
+            instrumentation.enable()
+        else:
+            instrumentation.disable()
+    def _teardown():
+        if saved.pop():
+            instrumentation.enable()
+        else:
+            instrumentation.disable()
+        instrumentation.collector.reset()
+    return {'setup': _setup, 'teardown': _teardown}
+
+def cases():
+    view = create_view(BenchmarkView)
+    request = utils.RequestFactory().get('/')
+    return [
+        Case('direct', _direct, [request], number=1000),
+        Case('create_view', view, [request], number=1000,
+            **_instrumentation(False)),
+        Case('create_view_stateless', create_view(StatelessBenchmarkView),
+            [request], number=1000, **_instrumentation(False)),
+        Case('create_view_instrumented', view, [request], number=1000,
+            **_instrumentation(True)),
+        Case('setup_per_request', create_view(PerRequestSetupView), [request],
+            **_instrumentation(False)),
+        Case('setup_once', create_view(ClassSetupView), [request],
+            **_instrumentation(False)),
+        Case('setup_once_stateless', create_view(StatelessSetupView),
+            [request], **_instrumentation(False)),
+    ]
@@ -0,0 +1,41 @@
+"""
+Benchmarks for the ``pagination`` tag in
+``django_zsutils.templatetags.zsutils.pagination``: rendering the navigation
+of a shallow and a very deep page of ten million rows.
+"""
+
+from django.core.paginator import Paginator
+from django.template import Context
+
+from django_zsutils.templatetags.zsutils import pagination
+from tests import utils
+
+from . import Case
+
+class Rows(object):
+    """
+    Sequence of ``length`` numbers, which doesn't have to be built.
+    """
+
+    def __init__(self, length):
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        return range(*index.indices(self.length))
+
+PAGINATOR = Paginator(Rows(10000000), 20)
+
+def _contexts(number):
+    request = utils.RequestFactory().get('/', {'q': 'search', 'p': number})
+    return [Context({'page': PAGINATOR.page(number), 'request': request})]
+
+def cases():
+    node = pagination.PaginationNode('pagination.html')
+    return [
+        Case('render_shallow', node.render, _contexts(2)),
+        Case('render_deep', node.render, _contexts(400000)),
+        Case('render_last', node.render, _contexts(PAGINATOR.num_pages)),
+    ]
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+"""
+Runs the benchmark suites and compares the results against the stored
+baseline. Every suite runs in a process of its own, so that its memory
+numbers aren't affected by the other suites. See the docstring of the
+benchmarks package for details.
+"""
+
+import sys
+import os
+import subprocess
+import tempfile
+from optparse import OptionParser, SUPPRESS_HELP
+from os.path import abspath, dirname, join, pardir
+
+os.environ['DJANGO_SETTINGS_MODULE'] = 'settings'
+sys.path.insert(0, join(dirname(__file__), pardir))
+
+SUITES = ('ctn', 'oopviews', 'generic', 'pagination', 'taghelpers', 'flash',
+    'dateformat', )
+
+def main():
+    parser = OptionParser(usage="%prog [options] [suite ...]")
+    parser.add_option('--rounds', type='int', default=10,
+        help="number of rounds per case (default: %default)")
+    parser.add_option('--baseline', default=None,
+        help="path of the baseline file")
+    parser.add_option('--save-baseline', action='store_true', default=False,
+        help="store the results as the new baseline")
+    parser.add_option('--tolerance', type='float', default=0.2,
+        help="allowed slowdown against the baseline (default: %default)")
+    parser.add_option('--output', default=None,
+        help="write the results as JSON to this file")
+    # Used by the runner to run a single suite in a new process
+    parser.add_option('--suite-only', action='store_true', default=False,
+        help=SUPPRESS_HELP)
+    (options, suites) = parser.parse_args()
+
+    import benchmarks
+    if options.suite_only:
+        benchmarks.save_baseline(run_suite(suites[0], options.rounds),
+            options.output)
+        return 0
+    baseline_path = options.baseline or benchmarks.DEFAULT_BASELINE
+    results = {}
+    for suite in suites or SUITES:
+        results.update(run_suite_in_process(suite, options.rounds))
+
+    if options.output:
+        benchmarks.save_baseline(results, options.output)
+
+    if options.save_baseline:
+        baseline = benchmarks.load_baseline(baseline_path) or {}
+        baseline.update(results)
+        benchmarks.save_baseline(baseline, baseline_path)
+        sys.stdout.write("Baseline written to %s\n" % baseline_path)
+        return 0
+    baseline = benchmarks.load_baseline(baseline_path)
+    if baseline is None:
+        return 0
+    regressions = benchmarks.compare(results, baseline, options.tolerance)
+    for (name, expected, current) in regressions:
+        sys.stderr.write("REGRESSION %s: %.0f ops/s (baseline %.0f ops/s)\n"
+            % (name, current, expected))
+    return regressions and 1 or 0
+
+def run_suite(suite, rounds):
+    """
+    Runs the cases of the given suite in this process and returns their
+    results.
+    """
+    import benchmarks
+    from django.db import connection
+    connection.creation.create_test_db(verbosity=0)
+    module = __import__('benchmarks.%s' % suite, {}, {}, ['cases'])
+    results = {}
+    for case in module.cases():
+        name = '%s.%s' % (suite, case.name)
+        result = benchmarks.measure(case, rounds=rounds)
+        results[name] = result
+        sys.stdout.write("%-45s %12.0f ops/s  p50 %9.2fus  p90 %9.2fus  "
+            "p99 %9.2fus  rss %skB (+%skB)\n" % (name, result['ops_per_sec'],
+                result['p50_us'], result['p90_us'], result['p99_us'],
+                result['max_rss_kb'], result['max_rss_growth_kb']))
+        sys.stdout.flush()
+    return results
+
+def run_suite_in_process(suite, rounds):
+    """
+    Runs the given suite in a new Python process and returns its results.
+    """
+    import benchmarks
+    (fd, path) = tempfile.mkstemp(suffix='.json')
+    os.close(fd)
+    try:
+        status = subprocess.call([sys.executable, abspath(__file__),
+            '--suite-only', '--rounds', str(rounds), '--output', path, suite])
+        if status != 0:
+            raise RuntimeError("The %s suite failed with status %d"
+                % (suite, status))
+        return benchmarks.load_baseline(path)
+    finally:
+        os.remove(path)
+
+if __name__ == '__main__':
+    sys.exit(main())
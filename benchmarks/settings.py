@@ -0,0 +1,19 @@
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    },
+}
+
+INSTALLED_APPS = (
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django_zsutils',
+    'tagging',
+    'tests',
+)
+
+SESSION_ENGINE = 'django.contrib.sessions.backends.cache'
+
+CTN_ACCEPT_CACHE_SIZE = 256
+ROOT_URLCONF = 'benchmarks.urls'
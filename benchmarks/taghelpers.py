@@ -0,0 +1,53 @@
+"""
+Benchmarks for the ``object_tags`` tag in
+``django_zsutils.templatetags.zsutils.taghelpers``: rendering the tags of
+50 objects with 10 tags each, with and without the link cache.
+"""
+
+from django.core.urlresolvers import reverse as url_reverse
+from django.template import Context
+from tagging.utils import parse_tag_input
+
+from django_zsutils.templatetags.zsutils import taghelpers
+
+from . import Case
+
+OBJECTS = 50
+TAGS_PER_OBJECT = 10
+
+class UncachedTagsForObjectNode(taghelpers.TagsForObjectNode):
+    """
+    The rendering as it was before the link cache was introduced.
+    """
+
+    def render(self, context):
+        tags = parse_tag_input(self.tags_string.resolve(context))
+        tags = ['<a href="%s" rel="tag">%s</a>' % (url_reverse(self.urlname,
+            kwargs={'tag':t}), t) for t in tags]
+        if len(tags) > 2:
+            first_part = self.junctor.join(tags[:-1])
+            return first_part + self.last_junctor + tags[-1]
+        if len(tags) == 2:
+            return self.last_junctor.join(tags)
+        return self.junctor.join(tags)
+
+def _contexts():
+    return [Context({'tags': ' '.join(['tag%d' % ((i * 7 + j) % 120)
+        for j in range(TAGS_PER_OBJECT)])}) for i in range(OBJECTS)]
+
+def _render_page(node):
+    contexts = _contexts()
+    def _render(value):
+        for context in contexts:
+            node.render(context)
+    return _render
+
+def cases():
+    return [
+        Case('object_tags_uncached', _render_page(
+            UncachedTagsForObjectNode('tags', 'blog-tag', '", "', '" and "')),
+            number=5),
+        Case('object_tags_cached', _render_page(
+            taghelpers.TagsForObjectNode('tags', 'blog-tag', '", "',
+                '" and "')), number=5, setup=taghelpers.clear_link_cache),
+    ]
@@ -0,0 +1,9 @@
+from django.conf.urls.defaults import patterns, url
+from django.http import HttpResponse
+
+def tag_detail(request, tag):
+    return HttpResponse(tag)
+
+urlpatterns = patterns('',
+    url(r'^blog/tags/(?P<tag>[^/]+)/$', tag_detail, name='blog-tag'),
+)
@@ -3,9 +3,10 @@ This module contains template tags for instance for a unified pagination
 look and feel.
 """
 from django.conf import settings
-from django.utils.dateformat import format
 from django import template
 
+from django_zsutils.utils.dateformat import format
+
 register = template.Library()
 
 @register.filter('datetime')
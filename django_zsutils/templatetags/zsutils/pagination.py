@@ -28,14 +28,63 @@ this many pages). You can configure this value again in your settings.py by
 setting PAGINATION_PAGE_LIMIT to whatever number of pages you like (note that
 a value below 3 hardly makes any sense, so you will get an error message if
 you still try that).
+
+The links keep all the other query parameters of the current request if it
+is available in the context as "request" (for instance through the
+django.core.context_processors.request context processor). The page number
+is passed in the "p" query parameter, which you can change with
+settings.PAGINATION_PAGE_PARAMETER.
+
+If you set settings.PAGINATION_CACHE_TIMEOUT, the rendered pagination is
+stored in Django's cache for this number of seconds and reused for other
+requests of the same page, number of pages and query string.
+
+If the page comes from a ``django_zsutils.utils.paginator.CachedCountPaginator``
+that only estimated the number of objects, the total is shown as approximate
+and no link to the last page is rendered.
+
+For pages of a ``django_zsutils.utils.paginator.KeysetPaginator`` use the
+keyset_pagination tag instead::
+
+    {% keyset_pagination %}
+
+It renders links to the first, the previous and the next page using the
+cursors of the page (customize it by overwriting keyset_pagination.html).
+The links pass the cursor in the "cursor" query parameter, which you can
+change with settings.PAGINATION_CURSOR_PARAMETER. In the view this looks
+like this::
+
+    paginator = KeysetPaginator(NewsItem.objects.all(), 5)
+    page = paginator.page(request.GET.get('cursor'))
 """
 
-from django.template import Library
+import hashlib
+
+from django.core.cache import cache
+from django.template import Context, Library, Node, TemplateSyntaxError
+from django.template.loader import get_template
 from django.conf import settings
+from django.utils.encoding import smart_str
+from django.utils.translation import get_language
 
 register = Library()
 
-@register.inclusion_tag('pagination.html', takes_context=True)
+def _get_url_prefix(context, parameter):
+    """
+    Returns the start of the URL for linking to other pages, containing
+    all the query parameters of the current request (if it is available in
+    the context) except for the given one.
+    """
+    request = context.get('request', None)
+    if request is None:
+        return '?'
+    params = request.GET.copy()
+    if parameter in params:
+        del params[parameter]
+    if not params:
+        return '?'
+    return '?%s&' % params.urlencode()
+
 def pagination(context):
     """
     For details on this templatetag see the pydoc for this module
@@ -48,23 +97,95 @@ def pagination(context):
     page = context.get(ctx_var, None)
     if page is None:
         return {'has_pagination':False}
-    # Calculate the number of pages on each side of the current page
-    lower_half = (page_limit-(page_limit % 2 == 0 and 1 or 0))/2
-    previous_pages = range(1, page.number)[-lower_half:]
-    upper_half = (page_limit/2)
-    if len(previous_pages) < lower_half:
-        upper_half += lower_half-len(previous_pages)
-    next_pages = range(page.number+1, page.paginator.num_pages+1)[:upper_half]
-    if len(next_pages) < upper_half:
-        lower_half += upper_half-len(next_pages)
-        previous_pages = range(1, page.number)[-lower_half:]
+    number = page.number
     last_page = page.paginator.num_pages
+    # If the paginator only knows an estimate of the number of pages, there
+    # is no sense in linking to the last one. The estimate might also be too
+    # low for the current page.
+    count_is_estimate = getattr(page.paginator, 'count_is_estimate', False)
+    if count_is_estimate:
+        last_page = max(last_page, number + (page.has_next() and 1 or 0))
+    # Calculate the number of pages on each side of the current page. Pages
+    # not used on one side are given to the other one.
+    lower_half = (page_limit-(page_limit % 2 == 0 and 1 or 0))//2
+    upper_half = page_limit//2
+    previous_count = min(lower_half, number-1)
+    upper_half += lower_half-previous_count
+    next_count = min(upper_half, last_page-number)
+    if next_count < upper_half:
+        lower_half += upper_half-next_count
+        previous_count = min(lower_half, number-1)
+    previous_pages = range(number-previous_count, number)
+    next_pages = range(number+1, number+1+next_count)
+    page_parameter = getattr(settings, 'PAGINATION_PAGE_PARAMETER', 'p')
     return {
         'page': page,
         'previous_pages': previous_pages,
         'next_pages': next_pages,
         'has_pagination': True, 
-        'show_first': page.number != 1 and page.number not in previous_pages,
-        'show_last': page.number != last_page and page.number not in next_pages,
+        'show_first': number != 1 and number not in previous_pages,
+        'show_last': number != last_page and number not in next_pages \
+            and not count_is_estimate,
         'last_page': last_page,
-    }
\ No newline at end of file
+        'count_is_estimate': count_is_estimate,
+        'page_url': '%s%s=' % (_get_url_prefix(context, page_parameter),
+            page_parameter),
+    }
+
+class PaginationNode(Node):
+    """
+    Renders the pagination template. If settings.PAGINATION_CACHE_TIMEOUT
+    is set, the output is cached for this number of seconds keyed by
+    everything it depends on.
+    """
+
+    def __init__(self, template_name):
+        self.template_name = template_name
+        self.template = None
+
+    def render(self, context):
+        values = pagination(context)
+        timeout = getattr(settings, 'PAGINATION_CACHE_TIMEOUT', None)
+        key = None
+        if timeout and values['has_pagination']:
+            key = 'zsutils.pagination:%s' % hashlib.md5(smart_str(repr((
+                values['page'].number, values['last_page'],
+                values['count_is_estimate'],
+                getattr(settings, 'PAGINATION_PAGE_LIMIT', 10),
+                self.template_name, values['page_url'], get_language(),
+            )))).hexdigest()
+            output = cache.get(key)
+            if output is not None:
+                return output
+        if self.template is None:
+            self.template = get_template(self.template_name)
+        output = self.template.render(Context(values,
+            autoescape=context.autoescape))
+        if key is not None:
+            cache.set(key, output, timeout)
+        return output
+
+@register.tag('pagination')
+def do_pagination(parser, token):
+    if len(token.split_contents()) != 1:
+        raise TemplateSyntaxError("The pagination tag takes no arguments")
+    return PaginationNode('pagination.html')
+
+@register.inclusion_tag('keyset_pagination.html', takes_context=True)
+def keyset_pagination(context):
+    """
+    For details on this templatetag see the pydoc for this module
+    """
+    ctx_var = getattr(settings, 'CONTEXT_PAGINATION_VARIABLE', 'page')
+    page = context.get(ctx_var, None)
+    if page is None or not page.has_other_pages():
+        return {'has_pagination': False}
+    cursor_parameter = getattr(settings, 'PAGINATION_CURSOR_PARAMETER',
+        'cursor')
+    url_prefix = _get_url_prefix(context, cursor_parameter)
+    return {
+        'page': page,
+        'first_url': url_prefix.rstrip('&'),
+        'cursor_url': '%s%s=' % (url_prefix, cursor_parameter),
+        'has_pagination': True,
+    }
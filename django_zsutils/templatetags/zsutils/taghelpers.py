@@ -5,27 +5,137 @@ This module contains some additional helper tags for the django-tagging
 project. Note that the functionality here might already be present in
 django-tagging but perhaps with some slightly different behaviour or 
 usage.
+
+When rendering the tags of many objects, load them in bulk first, either in
+the view with ``prefetch_tags(object_list)`` or in the template::
+
+    {% prefetch_tags object_list %}
+    {% for object in object_list %}
+        {% object_tags object blog-tag ", " " and " %}
+    {% endfor %}
+
+This fetches the tags of all the objects with a single query. Passing
+the object itself to ``object_tags`` (instead of a string of tags) uses the
+prefetched tags; the ``TagField`` values of the objects are filled too.
 """
 
 from django import template
-from django.core.urlresolvers import reverse as url_reverse
-from tagging.utils import parse_tag_input
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import models
+from django.db.models import Q
+from django.core.urlresolvers import reverse as url_reverse, get_urlconf, \
+    get_script_prefix
+from tagging.fields import TagField
+from tagging.models import Tag, TaggedItem
+from tagging.utils import parse_tag_input, edit_string_for_tags
+
+from django_zsutils.utils.lru import LRUCache
 
 register = template.Library()
 
+PREFETCHED_TAGS_ATTRIBUTE = 'prefetched_tags'
+
+_link_cache = None
+
+def get_link_cache():
+    """
+    Returns the per-process cache of rendered tag links. Its size can be
+    configured through settings.TAGHELPERS_LINK_CACHE_SIZE (default: 1000).
+    """
+    global _link_cache
+    if _link_cache is None:
+        _link_cache = LRUCache(int(getattr(settings,
+            'TAGHELPERS_LINK_CACHE_SIZE', 1000)))
+    return _link_cache
+
+def clear_link_cache():
+    """
+    Empties the cache of rendered tag links. Links are cached per URLconf
+    and script prefix, so you only need this if you change the URLconf
+    module itself at runtime.
+    """
+    get_link_cache().clear()
+
+def prefetch_tags(objects):
+    """
+    Loads the tags of all the given objects (which may be of different
+    models) with a single query and stores them as list of ``Tag`` objects
+    in the ``prefetched_tags`` attribute of every object. The values of
+    their ``TagField`` fields are set as well. Returns the objects as a
+    list.
+    """
+    objects = list(objects)
+    if not objects:
+        return objects
+    object_map = {}
+    ids_by_type = {}
+    for obj in objects:
+        ct_id = ContentType.objects.get_for_model(obj).pk
+        object_map.setdefault((ct_id, obj.pk), []).append(obj)
+        ids_by_type.setdefault(ct_id, []).append(obj.pk)
+    condition = None
+    for ct_id, ids in ids_by_type.items():
+        q = Q(content_type__pk=ct_id, object_id__in=ids)
+        condition = condition is None and q or condition | q
+    tag_map = {}
+    for item in TaggedItem.objects.filter(condition).select_related('tag') \
+            .order_by('tag__name'):
+        tag_map.setdefault((item.content_type_id, item.object_id), []) \
+            .append(item.tag)
+    for key, objs in object_map.items():
+        tags = tag_map.get(key, [])
+        for obj in objs:
+            setattr(obj, PREFETCHED_TAGS_ATTRIBUTE, tags)
+            for field in obj._meta.fields:
+                if isinstance(field, TagField):
+                    field._set_instance_tag_cache(obj,
+                        edit_string_for_tags(tags))
+    return objects
+
 class TagsForObjectNode(template.Node):
+    anchor_format = u'<a href="%s" rel="tag">%s</a>'
+
     def __init__(self, tags_string, urlname, junctor=None, last_junctor=None):
         self.tags_string = template.Variable(tags_string)
         self.junctor = junctor is None and ', ' or junctor.lstrip('"').rstrip('"')
         self.last_junctor = last_junctor is None and ' and ' or last_junctor.lstrip('"').rstrip('"')
         self.urlname = urlname
 
+    def get_link(self, tag, cache):
+        """
+        Returns the link for the given tag, reversing the URL only if
+        it isn't already cached for the active URLconf.
+        """
+        key = (get_urlconf() or settings.ROOT_URLCONF, get_script_prefix(),
+            self.urlname, tag)
+        link = cache.get(key)
+        if link is None:
+            link = self.anchor_format % (url_reverse(self.urlname,
+                kwargs={'tag':tag}), tag)
+            cache.set(key, link)
+        return link
+
+    def get_tag_names(self, value):
+        """
+        Returns the tag names of the given value, which is either a string of
+        tags, a model instance or a sequence of ``Tag`` objects or names.
+        """
+        if isinstance(value, basestring):
+            return parse_tag_input(value)
+        if isinstance(value, models.Model):
+            tags = getattr(value, PREFETCHED_TAGS_ATTRIBUTE, None)
+            if tags is None:
+                tags = Tag.objects.get_for_object(value)
+            value = tags
+        return [getattr(tag, 'name', tag) for tag in value]
+
     def render(self, context):
-        tags = parse_tag_input(self.tags_string.resolve(context))
-        tags = ['<a href="%s" rel="tag">%s</a>' % (url_reverse(self.urlname, kwargs={'tag':t}), t) for t in tags]
+        cache = get_link_cache()
+        tags = [self.get_link(t, cache)
+            for t in self.get_tag_names(self.tags_string.resolve(context))]
         if len(tags) > 2:
-            first_part = self.junctor.join(tags[:-1])
-            return first_part + self.last_junctor + tags[-1]
+            return self.junctor.join(tags[:-1]) + self.last_junctor + tags[-1]
         if len(tags) == 2:
             return self.last_junctor.join(tags)
         return self.junctor.join(tags)
@@ -40,7 +150,33 @@ def tags_for_object(parser, token):
         {% object_tags object.tags blog-tag ", " " and " %}
     
     The last two arguments determine the junctor between the tag names with
-    the last being the last junctor being used.
+    the last being the last junctor being used. Instead of a string of tags
+    you can also pass an object, whose prefetched tags are used if
+    available, or a list of tags.
     """
     variables = token.split_contents()[1:]
     return TagsForObjectNode(*variables)
+
+class PrefetchTagsNode(template.Node):
+    def __init__(self, objects):
+        self.objects = template.Variable(objects)
+
+    def render(self, context):
+        prefetch_tags(self.objects.resolve(context))
+        return ''
+
+@register.tag('prefetch_tags')
+def do_prefetch_tags(parser, token):
+    """
+    Loads the tags of all the objects in the given list with a single query
+    for later use with ``object_tags``.
+
+    Usage::
+
+        {% prefetch_tags object_list %}
+    """
+    bits = token.split_contents()
+    if len(bits) != 2:
+        raise template.TemplateSyntaxError("%s takes exactly one argument"
+            % bits[0])
+    return PrefetchTagsNode(bits[1])
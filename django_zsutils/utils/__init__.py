@@ -2,4 +2,6 @@
 A collection of utility functions:
 
 * oopviews: help function and class for using OOP in Django-views
+* lru: a thread-safe, size-bounded LRU cache
+* dateformat: date formatting with precompiled format strings
 """
\ No newline at end of file
@@ -0,0 +1,95 @@
+"""
+Faster drop-in replacement for ``django.utils.dateformat.format``. Every
+format string is compiled only once into a sequence of literals and the
+``DateFormat`` methods producing the fields, so formatting a value no
+longer needs to split the format string again::
+
+    from django_zsutils.utils import dateformat
+
+    dateformat.format(value, 'jS F Y H:i')
+    dateformat.format_many(values, 'jS F Y H:i')
+
+The results are identical to the ones of ``django.utils.dateformat``.
+"""
+
+from django.utils.dateformat import DateFormat, re_formatchars, re_escaped
+from django.utils.encoding import force_unicode
+
+__all__ = ('CompiledFormat', 'compile_format', 'format', 'format_many', )
+
+# Format characters depending on the timezone of the value. Only if one of
+# them is used, the (for naive values rather expensive) local timezone has
+# to be determined.
+TIMEZONE_FORMATCHARS = frozenset('IOrTZ')
+
+_compiled_formats = {}
+
+class CompiledFormat(object):
+    """
+    A format string split into literals and field extractors.
+    """
+
+    def __init__(self, format_string):
+        self.format_string = format_string
+        pieces = []
+        self.needs_timezone = False
+        for i, piece in enumerate(re_formatchars.split(
+                force_unicode(format_string))):
+            if i % 2:
+                pieces.append((getattr(DateFormat, piece), None))
+                if piece in TIMEZONE_FORMATCHARS:
+                    self.needs_timezone = True
+            elif piece:
+                pieces.append((None, re_escaped.sub(r'\1', piece)))
+        self.pieces = tuple(pieces)
+
+    def _make_formatter(self, value):
+        if self.needs_timezone:
+            return DateFormat(value)
+        df = DateFormat.__new__(DateFormat)
+        df.data = value
+        df.timezone = getattr(value, 'tzinfo', None)
+        return df
+
+    def format(self, value):
+        df = self._make_formatter(value)
+        return u''.join([func is None and literal or force_unicode(func(df))
+            for (func, literal) in self.pieces])
+
+    def format_many(self, values):
+        """
+        Formats all the given values and returns the results as a list.
+        """
+        pieces = self.pieces
+        make_formatter = self._make_formatter
+        result = []
+        for value in values:
+            df = make_formatter(value)
+            result.append(u''.join([func is None and literal
+                or force_unicode(func(df)) for (func, literal) in pieces]))
+        return result
+
+def compile_format(format_string):
+    """
+    Returns the ``CompiledFormat`` for the given format string, which is
+    only compiled on the first call.
+    """
+    compiled = _compiled_formats.get(format_string)
+    if compiled is None:
+        # Format strings usually come from the code or the settings, so this
+        # limit should only be reached if they are built dynamically.
+        if len(_compiled_formats) >= 256:
+            _compiled_formats.clear()
+        compiled = _compiled_formats[format_string] = \
+            CompiledFormat(format_string)
+    return compiled
+
+def format(value, format_string):
+    return compile_format(format_string).format(value)
+
+def format_many(values, format_string):
+    """
+    Formats a whole sequence of values (for instance a column of a table)
+    with the same format string.
+    """
+    return compile_format(format_string).format_many(values)
@@ -1,5 +1,5 @@
 """
-A simple flash implementation based on miracle2k's snippet 
+A simple flash implementation based on miracle2k's snippet
 available on <http://www.djangosnippets.org/snippets/331/>.
 
 The additions are:
@@ -7,10 +7,63 @@ The additions are:
     * Some simple helper methods to add flash-messages for
       predefined levels
 
-    * Internally every level actually stores a list of messages
-      instead of just one single message.
+    * Every level can have multiple messages instead of just one
+      single message (duplicates are dropped).
+
+    * The messages are only loaded from and written to their storage if
+      they are actually used within a request. The storage is pluggable
+      through settings.FLASH_STORAGE (see the storage module for the
+      available backends).
+
+To use it, add the middleware and the context processor to your settings::
+
+    MIDDLEWARE_CLASSES = (
+        # ... (after the SessionMiddleware if you use the SessionStorage)
+        'django_zsutils.utils.flash.Middleware',
+    )
+    TEMPLATE_CONTEXT_PROCESSORS = (
+        # ...
+        'django_zsutils.utils.flash.context_processor',
+    )
+
+Messages added through ``request.flash`` are shown in the template of the
+next request that uses ``flash``. The levels of the messages are stored as
+numbers (NOTICE, WARNING and FAILURE), and the messages are serialized as a
+compact JSON list for the storage. Messages of custom types (``flash.add(
+'info', msg)``) get the NOTICE level but keep the name of their type.
 """
 
+import sys
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.encoding import force_unicode
+from django.utils.importlib import import_module
+
+try:
+    import json
+except ImportError:
+    from django.utils import simplejson as json
+
+_storage_class = None
+
+def get_storage_class():
+    """
+    Returns the storage backend class configured through
+    settings.FLASH_STORAGE.
+    """
+    global _storage_class
+    if _storage_class is None:
+        path = getattr(settings, 'FLASH_STORAGE',
+            'django_zsutils.utils.flash.storage.SessionStorage')
+        (module_name, class_name) = path.rsplit('.', 1)
+        try:
+            _storage_class = getattr(import_module(module_name), class_name)
+        except (ImportError, AttributeError), e:
+            raise ImproperlyConfigured("Error loading flash storage %s: %s"
+                % (path, e))
+    return _storage_class
+
 class Middleware(object):
     """
     Simple middleware that registers the flash property to the current
@@ -18,37 +71,259 @@ class Middleware(object):
     """
 
     def process_request(self, request):
-        request.flash = Flash()
+        request.flash = LazyFlash(get_storage_class()(request))
         return None
 
     def process_response(self, request, response):
-        if hasattr(request, 'flash') and len(request.flash) > 0:
-            request.session['_flash'] = request.flash
+        flash = getattr(request, 'flash', None)
+        if isinstance(flash, LazyFlash):
+            flash.store(response)
         return response
 
-class Flash(dict):
+NOTICE = 20
+WARNING = 30
+FAILURE = 40
+
+LEVEL_NAMES = {
+    NOTICE: 'notice',
+    WARNING: 'warning',
+    FAILURE: 'failure',
+}
+LEVELS = dict([(name, level) for (level, name) in LEVEL_NAMES.items()])
+
+# Level of the messages of custom types
+DEFAULT_LEVEL = NOTICE
+
+class Message(object):
+    """
+    A single flash message with its level and the name of its type.
+    """
+    __slots__ = ('level', 'msg', 'type')
+
+    def __init__(self, level, msg, type):
+        self.level = level
+        self.msg = msg
+        self.type = type
+
+def _type_name(type):
+    return LEVEL_NAMES.get(type, type)
+
+class Flash(object):
+    """
+    The flash messages of a request in the order they were added. Adding a
+    message that is already present has no effect and so has adding one
+    after settings.FLASH_MAX_MESSAGES (default: 20) messages or
+    settings.FLASH_MAX_BYTES (default: 2048) bytes of UTF-8 encoded messages
+    have been added.
+
+    Iterating over it yields a dictionary with the "type" (the name of the
+    level) and the "msg" for every message.
+    """
+
+    def __init__(self, max_messages=None, max_bytes=None):
+        if max_messages is None:
+            max_messages = getattr(settings, 'FLASH_MAX_MESSAGES', 20)
+        if max_bytes is None:
+            max_bytes = getattr(settings, 'FLASH_MAX_BYTES', 2048)
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.messages = []
+        self._seen = set()
+        self._bytes = 0
 
     def add_success(self, msg):
-        self.add('notice', msg)
+        return self.add(NOTICE, msg)
 
     def add_warning(self, msg):
-        self.add('warning', msg)
+        return self.add(WARNING, msg)
 
     def add_failure(self, msg):
-        self.add('failure', msg)
-    
+        return self.add(FAILURE, msg)
+
     def add(self, type, msg):
-        self.setdefault(type, []).append(msg)
+        """
+        Adds a message for the given level, the name of a level or a custom
+        type. Returns False if the message was dropped because it is a
+        duplicate or one of the limits has been reached.
+        """
+        type = _type_name(type)
+        return self._add(LEVELS.get(type, DEFAULT_LEVEL), type, msg)
+
+    def _add(self, level, type, msg):
+        msg = force_unicode(msg)
+        if (type, msg) in self._seen \
+                or len(self.messages) >= self.max_messages:
+            return False
+        size = len(msg.encode('utf-8'))
+        if self._bytes + size > self.max_bytes:
+            return False
+        self._seen.add((type, msg))
+        self._bytes += size
+        self.messages.append(Message(level, msg, type))
+        return True
+
+    def __setitem__(self, type, msgs):
+        # Sessions written by older versions contain a pickled dict subclass
+        # mapping the types to lists of messages. Pickle restores its items
+        # through this method without calling __init__.
+        if 'messages' not in self.__dict__:
+            Flash.__init__(self, sys.maxint, sys.maxint)
+        for msg in msgs:
+            self.add(type, msg)
+
+    def __len__(self):
+        return len(self.messages)
+
+    def __iter__(self):
+        for m in self.messages:
+            yield {'type': m.type, 'msg': m.msg}
+
+    def __getitem__(self, type):
+        name = _type_name(type)
+        msgs = [m.msg for m in self.messages if m.type == name]
+        if not msgs:
+            raise KeyError(type)
+        return msgs
+
+    def __contains__(self, type):
+        name = _type_name(type)
+        for m in self.messages:
+            if m.type == name:
+                return True
+        return False
+
+    def keys(self):
+        result = []
+        for m in self.messages:
+            if m.type not in result:
+                result.append(m.type)
+        return result
+
+    def items(self):
+        return [(k, self[k]) for k in self.keys()]
+
+    def dumps(self):
+        """
+        Returns the messages as compact JSON list of ``[level, msg]`` pairs,
+        extended to ``[level, msg, type]`` for the messages of custom types.
+        """
+        return json.dumps([m.type in LEVELS and [m.level, m.msg]
+            or [m.level, m.msg, m.type] for m in self.messages],
+            separators=(',', ':'))
+
+    def loads(cls, data):
+        """
+        Creates a Flash from the output of ``dumps``. Malformed data results
+        in an empty Flash.
+        """
+        flash = cls(max_messages=sys.maxint, max_bytes=sys.maxint)
+        try:
+            for item in json.loads(data):
+                if len(item) == 3:
+                    (level, msg, type) = item
+                else:
+                    (level, msg) = item
+                    type = LEVEL_NAMES[level]
+                flash._add(level, type, msg)
+        except (ValueError, TypeError, KeyError):
+            pass
+        return flash
+    loads = classmethod(loads)
+
+class LazyFlash(object):
+    """
+    Wrapper installed as ``request.flash`` by the middleware. Messages added
+    to it go into a new ``Flash``, which is only created when the first
+    message is added. The messages stored by previous requests are only
+    loaded from the storage once ``incoming`` is accessed.
+    """
+
+    def __init__(self, storage):
+        self._storage = storage
+        self._outgoing = None
+        self._incoming = None
+        self._loaded = False
+
+    def _get_outgoing(self):
+        if self._outgoing is None:
+            self._outgoing = Flash()
+        return self._outgoing
+
+    def __getattr__(self, name):
+        # Everything else is handled by the Flash of this request
+        return getattr(self._get_outgoing(), name)
+
+    def __len__(self):
+        if self._outgoing is None:
+            return 0
+        return len(self._outgoing)
 
     def __iter__(self):
-        for k in self.keys():
-            val = self[k]
-            for v in val:
-                yield {'type': k ,'msg': v}
+        return iter(self._get_outgoing())
+
+    def __getitem__(self, key):
+        return self._get_outgoing()[key]
+
+    def __contains__(self, key):
+        return self._outgoing is not None and key in self._outgoing
+
+    def _get_incoming(self):
+        """
+        The messages stored by a previous request. Accessing them removes
+        them from the storage at the end of this request.
+        """
+        if not self._loaded:
+            self._loaded = True
+            data = self._storage.load()
+            if data:
+                self._incoming = Flash.loads(data)
+            else:
+                self._incoming = Flash()
+        return self._incoming
+    incoming = property(_get_incoming)
+
+    def store(self, response):
+        """
+        Writes the messages of this request to the storage or removes the
+        ones already shown. The storage is left alone if neither happened.
+        """
+        if self._outgoing:
+            self._storage.save(response, self._outgoing.dumps())
+        elif self._loaded and self._incoming:
+            self._storage.clear(response)
+
+class IncomingFlash(object):
+    """
+    Lazy proxy for the incoming messages of a ``LazyFlash``, which only
+    loads them once a template actually uses them.
+    """
+
+    def __init__(self, flash):
+        self._flash = flash
+
+    def __iter__(self):
+        return iter(self._flash.incoming)
+
+    def __len__(self):
+        return len(self._flash.incoming)
+
+    def __nonzero__(self):
+        return len(self._flash.incoming) > 0
+
+    def __getitem__(self, key):
+        return self._flash.incoming[key]
+
+    def __contains__(self, key):
+        return key in self._flash.incoming
+
+    def keys(self):
+        return self._flash.incoming.keys()
+
+    def items(self):
+        return self._flash.incoming.items()
 
 def context_processor(request):
-    flash = None
-    if '_flash' in request.session:
-        flash = request.session['_flash']
-        del request.session['_flash']
-    return {'flash': flash}
+    flash = getattr(request, 'flash', None)
+    if not isinstance(flash, LazyFlash):
+        return {'flash': None}
+    return {'flash': IncomingFlash(flash)}
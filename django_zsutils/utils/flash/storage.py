@@ -0,0 +1,118 @@
+"""
+Storage backends for flash messages. A backend is created for every request
+and is only asked to load, save or clear the messages if they are actually
+used during this request. Choose one through settings.FLASH_STORAGE (the
+default is ``django_zsutils.utils.flash.storage.SessionStorage``).
+
+Custom backends have to subclass ``BaseStorage`` and implement its
+``load``, ``save`` and ``clear`` methods.
+"""
+
+import base64
+
+from django.conf import settings
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from . import Flash
+
+__all__ = ('BaseStorage', 'SessionStorage', 'CookieStorage', )
+
+class BaseStorage(object):
+
+    def __init__(self, request):
+        self.request = request
+
+    def load(self):
+        """
+        Returns the stored messages as serialized by ``Flash.dumps`` or None
+        if there are no messages.
+        """
+        raise NotImplementedError
+
+    def save(self, response, data):
+        """
+        Stores the given serialized messages, replacing the stored ones.
+        """
+        raise NotImplementedError
+
+    def clear(self, response):
+        """
+        Removes the stored messages.
+        """
+        raise NotImplementedError
+
+class SessionStorage(BaseStorage):
+    """
+    Stores the messages in the session.
+    """
+    session_key = '_flash'
+
+    def load(self):
+        data = self.request.session.get(self.session_key)
+        if isinstance(data, Flash):
+            # Stored by an older version, which pickled the whole Flash
+            data = data.dumps()
+        return data
+
+    def save(self, response, data):
+        self.request.session[self.session_key] = data
+
+    def clear(self, response):
+        if self.session_key in self.request.session:
+            del self.request.session[self.session_key]
+
+class CookieStorage(BaseStorage):
+    """
+    Stores the messages in a cookie signed with the SECRET_KEY so that
+    flash messages never need the session. The name of the cookie can be
+    configured through settings.FLASH_COOKIE_NAME (default: "flash").
+
+    Browsers drop cookies bigger than about 4 KB, so if the encoded messages
+    don't fit into ``max_cookie_size`` bytes (including the name of the
+    cookie), the last messages are left out.
+    """
+    salt = 'django_zsutils.utils.flash.storage.CookieStorage'
+    max_cookie_size = 4096
+
+    def __init__(self, request):
+        super(CookieStorage, self).__init__(request)
+        self.cookie_name = getattr(settings, 'FLASH_COOKIE_NAME', 'flash')
+
+    def _sign(self, value):
+        return salted_hmac(self.salt, value).hexdigest()
+
+    def load(self):
+        data = self.request.COOKIES.get(self.cookie_name)
+        if not data or ':' not in data:
+            return None
+        (value, signature) = data.rsplit(':', 1)
+        if not constant_time_compare(signature, self._sign(value)):
+            return None
+        try:
+            return base64.urlsafe_b64decode(str(value))
+        except (ValueError, TypeError):
+            return None
+
+    def _encode(self, data):
+        value = base64.urlsafe_b64encode(data)
+        return '%s:%s' % (value, self._sign(value))
+
+    def save(self, response, data):
+        value = self._encode(data)
+        if len(self.cookie_name) + 1 + len(value) > self.max_cookie_size:
+            flash = Flash.loads(data)
+            while flash.messages and len(self.cookie_name) + 1 \
+                    + len(value) > self.max_cookie_size:
+                flash.messages.pop()
+                value = self._encode(flash.dumps())
+            if not flash.messages:
+                self.clear(response)
+                return
+        response.set_cookie(self.cookie_name, value,
+            domain=settings.SESSION_COOKIE_DOMAIN,
+            secure=settings.SESSION_COOKIE_SECURE or None, httponly=True)
+
+    def clear(self, response):
+        if self.cookie_name in self.request.COOKIES:
+            response.delete_cookie(self.cookie_name,
+                domain=settings.SESSION_COOKIE_DOMAIN)
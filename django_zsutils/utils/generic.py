@@ -1,10 +1,473 @@
-from django.db import models
+from __future__ import with_statement
+
+import sys
+import threading
+import Queue
+from contextlib import contextmanager
+from timeit import default_timer
+
+from django.core.exceptions import ValidationError
+from django.db import connections, models, router, transaction
+from django.db.models import signals
+from django.dispatch import Signal
+from django.db.models.query import QuerySet
+from django.contrib.contenttypes.models import ContentType
+
+from .lru import LRUCache
+
+class _WorkerPool(object):
+    """
+    Long-lived daemon threads running the jobs put into a shared queue. The
+    threads keep their database connections open between the jobs, so they
+    don't have to connect again for every ``relate`` call.
+    """
+
+    def __init__(self):
+        self._jobs = Queue.Queue()
+        self._lock = threading.Lock()
+        self.size = 0
+
+    def _work(self):
+        while True:
+            job = self._jobs.get()
+            job()
+
+    def grow(self, size):
+        """
+        Starts threads until there are at least ``size`` of them.
+        """
+        self._lock.acquire()
+        try:
+            while self.size < size:
+                thread = threading.Thread(target=self._work)
+                thread.setDaemon(True)
+                thread.start()
+                self.size += 1
+        finally:
+            self._lock.release()
+
+    def submit(self, job):
+        self._jobs.put(job)
+
+# Shared by all the relate calls, grows to the largest number of workers
+# one of them has asked for
+_pool = _WorkerPool()
+
+def _run_in_threads(func, calls, workers):
+    """
+    Calls ``func`` with every argument tuple in ``calls`` using at most
+    ``workers`` threads of the worker pool and returns the results in the
+    same order. If one of the calls raises an exception, it is re-raised in
+    the calling thread and the database connections of the thread it
+    occurred in are closed, so that a broken connection isn't reused.
+    """
+    queue = Queue.Queue()
+    for index, args in enumerate(calls):
+        queue.put((index, args))
+    results = [None] * len(calls)
+    errors = []
+    runners = min(workers, len(calls))
+    finished = threading.Semaphore(0)
+
+    def runner():
+        try:
+            while not errors:
+                try:
+                    (index, args) = queue.get_nowait()
+                except Queue.Empty:
+                    return
+                try:
+                    results[index] = func(*args)
+                except Exception:
+                    errors.append(sys.exc_info())
+                    for connection in connections.all():
+                        connection.close()
+        finally:
+            finished.release()
+
+    _pool.grow(runners)
+    for i in range(runners):
+        _pool.submit(runner)
+    for i in range(runners):
+        finished.acquire()
+    if errors:
+        raise errors[0][0], errors[0][1], errors[0][2]
+    return results
+
+# Sent by GFKManager.relate (and its lazy variants) for every batch of items
+# with a RelateStats instance, but only if there are receivers
+relate_finished = Signal(providing_args=['stats'])
+
+class RelateStats(object):
+    """
+    Statistics of a single ``relate`` call: the number of ``rows`` (items),
+    distinct ``content_types``, target ``queries``, ``objects`` fetched from
+    the database and ``cached`` ones taken from the object cache, and the
+    total ``time`` in seconds. ``per_content_type`` holds the same numbers
+    (plus the ``database`` and the number of ``worker_queries`` sent by
+    worker threads) for every "app_label.modelname".
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.rows = 0
+        self.content_types = 0
+        self.queries = 0
+        self.objects = 0
+        self.cached = 0
+        self.time = 0.0
+        self.per_content_type = {}
+        self._lock = threading.Lock()
+        self._thread = threading.currentThread()
+
+    def __repr__(self):
+        return '<RelateStats for %s: %d rows, %d content types, %d queries>' \
+            % (self.model._meta.object_name, self.rows, self.content_types,
+                self.queries)
+
+    def _get_content_type(self, model):
+        label = '%s.%s' % (model._meta.app_label,
+            model._meta.object_name.lower())
+        data = self.per_content_type.get(label)
+        if data is None:
+            data = self.per_content_type[label] = {'queries': 0,
+                'worker_queries': 0, 'objects': 0, 'cached': 0,
+                'time': 0.0, 'database': None}
+        return data
+
+    def add_query(self, model, database, objects, time):
+        self._lock.acquire()
+        try:
+            data = self._get_content_type(model)
+            data['queries'] += 1
+            if threading.currentThread() is not self._thread:
+                data['worker_queries'] += 1
+            data['objects'] += objects
+            data['time'] += time
+            data['database'] = database
+            self.queries += 1
+            self.objects += objects
+        finally:
+            self._lock.release()
+
+    def add_cached(self, model, objects):
+        self._get_content_type(model)['cached'] += objects
+        self.cached += objects
+
+    def as_dict(self):
+        return {
+            'model': '%s.%s' % (self.model._meta.app_label,
+                self.model._meta.object_name.lower()),
+            'rows': self.rows,
+            'content_types': self.content_types,
+            'queries': self.queries,
+            'objects': self.objects,
+            'cached': self.cached,
+            'time': self.time,
+            'per_content_type': dict([(label, dict(data))
+                for (label, data) in self.per_content_type.items()]),
+        }
+
+@contextmanager
+def track_relate():
+    """
+    Context manager collecting the ``RelateStats`` of all the ``relate``
+    calls of the current thread within its block in a list::
+
+        with track_relate() as calls:
+            items = GenericItem.objects.relate(items)
+        print calls[0].queries
+    """
+    calls = []
+    thread = threading.currentThread()
+    def receiver(sender, stats, **kwargs):
+        if threading.currentThread() is thread:
+            calls.append(stats)
+    relate_finished.connect(receiver, weak=False)
+    try:
+        yield calls
+    finally:
+        relate_finished.disconnect(receiver)
+
+@contextmanager
+def assert_relate_queries(max_queries, using=None):
+    """
+    Context manager for tests raising an ``AssertionError`` if more than
+    ``max_queries`` SQL queries are sent to the databases (or only to the
+    alias or list of aliases ``using``) within its block. As the queries
+    that actually reach the database are counted, including the ones for
+    the items and any triggered by accessing the content objects, it also
+    fails if the objects aren't bound properly by ``relate``::
+
+        with assert_relate_queries(3):
+            items = GenericItem.objects.relate(GenericItem.objects.all())
+            titles = [item.content_object.title for item in items]
+
+    The queries of ``relate`` workers are sent through their own
+    connections and are added based on the ``RelateStats`` of the calls,
+    which are the value of the ``with`` statement.
+    """
+    if using is None:
+        aliases = list(connections)
+    elif isinstance(using, basestring):
+        aliases = [using]
+    else:
+        aliases = list(using)
+    debug_cursors = {}
+    counts = {}
+    for alias in aliases:
+        connection = connections[alias]
+        debug_cursors[alias] = connection.use_debug_cursor
+        connection.use_debug_cursor = True
+        counts[alias] = -len(connection.queries)
+    try:
+        with track_relate() as calls:
+            yield calls
+    finally:
+        for alias in aliases:
+            connection = connections[alias]
+            counts[alias] += len(connection.queries)
+            connection.use_debug_cursor = debug_cursors[alias]
+    for stats in calls:
+        for data in stats.per_content_type.values():
+            if data['database'] in counts:
+                counts[data['database']] += data['worker_queries']
+    executed = sum(counts.values())
+    if executed > max_queries:
+        raise AssertionError('%d queries executed (%s), expected at most '
+            '%d; relate issued %d queries for %d rows of %d content types'
+            % (executed, ', '.join(['%s: %d' % (alias, counts[alias])
+                for alias in aliases if counts[alias]]), max_queries,
+                sum([stats.queries for stats in calls]),
+                sum([stats.rows for stats in calls]),
+                sum([stats.content_types for stats in calls])))
+
+def _pk_to_python(model, value):
+    """
+    Converts an object id stored in a generic relation to the type of the
+    primary key of ``model``, so that it can be compared with ``obj.pk``.
+    """
+    field = model._meta.pk
+    while field.rel is not None:
+        field = field.rel.get_related_field()
+    try:
+        return field.to_python(value)
+    except ValidationError:
+        return value
+
+class BaseObjectCache(object):
+    """
+    Base class for the identity-map caches ``GFKManager.relate`` can use
+    to look up the targets of generic relations before querying for them.
+    Entries are keyed by ``(content type id, object id, database alias)``
+    and removed automatically whenever a cached object is saved or deleted.
+    Subclasses have to implement ``get_many``, ``set_many`` and
+    ``delete``.
+    """
+
+    def __init__(self):
+        self._watched = set()
+
+    def get_many(self, keys):
+        """
+        Returns a dictionary of all the given keys found in the cache.
+        """
+        raise NotImplementedError
+
+    def set_many(self, mapping):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def watch(self, model):
+        """
+        Makes sure that cached objects of the given model are invalidated
+        when they are changed or deleted.
+        """
+        if model in self._watched:
+            return
+        self._watched.add(model)
+        uid = 'django_zsutils.generic.%d.%s.%s' % (id(self),
+            model._meta.app_label, model._meta.object_name)
+        signals.post_save.connect(self._invalidate, sender=model,
+            weak=False, dispatch_uid=uid)
+        signals.post_delete.connect(self._invalidate, sender=model,
+            weak=False, dispatch_uid=uid)
+
+    def _invalidate(self, sender, instance, **kwargs):
+        ct = ContentType.objects.get_for_model(sender)
+        # Copies of the object in other databases (e.g. replicas) are stale
+        # now as well
+        for db in connections:
+            self.delete((ct.id, instance.pk, db))
+
+class LocalObjectCache(BaseObjectCache):
+    """
+    In-process cache holding at most ``maxsize`` objects for ``timeout``
+    seconds. Note that the cached instances are shared between all
+    requests of the process, so treat them as read-only.
+    """
+
+    def __init__(self, maxsize=10000, timeout=300):
+        super(LocalObjectCache, self).__init__()
+        self._cache = LRUCache(maxsize, timeout)
+
+    def get_many(self, keys):
+        result = {}
+        for key in keys:
+            obj = self._cache.get(key)
+            if obj is not None:
+                result[key] = obj
+        return result
+
+    def set_many(self, mapping):
+        for key, obj in mapping.items():
+            self._cache.set(key, obj)
+
+    def delete(self, key):
+        self._cache.delete(key)
+
+    def stats(self):
+        return self._cache.stats()
+
+class DjangoObjectCache(BaseObjectCache):
+    """
+    Cache storing the objects in one of Django's cache backends for
+    ``timeout`` seconds. If no ``cache`` is given, the default one is used.
+    Limiting the number of entries is left to the backend.
+    """
+
+    def __init__(self, cache=None, timeout=300, key_prefix='zsutils.gfk'):
+        super(DjangoObjectCache, self).__init__()
+        if cache is None:
+            from django.core.cache import cache
+        self._cache = cache
+        self.timeout = timeout
+        self.key_prefix = key_prefix
+
+    def _make_key(self, key):
+        return '%s:%s:%s:%s' % (self.key_prefix, key[2], key[0], key[1])
+
+    def get_many(self, keys):
+        keymap = dict([(self._make_key(key), key) for key in keys])
+        found = self._cache.get_many(keymap.keys())
+        return dict([(keymap[k], obj) for (k, obj) in found.items()])
+
+    def set_many(self, mapping):
+        for key, obj in mapping.items():
+            self._cache.set(self._make_key(key), obj, self.timeout)
+
+    def delete(self, key):
+        self._cache.delete(self._make_key(key))
+
+class GFKQuerySet(QuerySet):
+    """
+    QuerySet returned by ``GFKManager``. Its ``prefetch_gfk`` method lets
+    you defer binding the content objects until the queryset is evaluated.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(GFKQuerySet, self).__init__(*args, **kwargs)
+        self._gfk_manager = None
+        self._gfk_prefetch = None
+
+    def prefetch_gfk(self, content_type_field=None, object_id_field=None,
+            content_object_field=None, chunk_size=1000, batch_size=500,
+            specs=None, using=None):
+        """
+        Returns a new queryset that binds the content objects of its items
+        once it is evaluated, for the fetched rows only. The field names
+        default to the ones the manager was configured with. This way the
+        queryset can still be sliced, paginated or partially iterated::
+
+            paginator = Paginator(GenericItem.objects.prefetch_gfk(), 20)
+            page = paginator.page(3)
+
+        Here only the content objects of the 20 items on page 3 are
+        loaded, using one query per content type. ``batch_size``,
+        ``specs`` and ``using`` work the same way as with
+        ``GFKManager.relate``.
+        """
+        fields = self._get_gfk_manager()._get_fields(content_type_field,
+            object_id_field, content_object_field)
+        return self._clone(_gfk_prefetch={
+            'fields': fields,
+            'chunk_size': chunk_size,
+            'batch_size': batch_size,
+            'specs': specs,
+            'using': using,
+        })
+
+    def iterator(self):
+        iterator = super(GFKQuerySet, self).iterator()
+        if self._gfk_prefetch is None:
+            return iterator
+        return self._get_gfk_manager()._relate_chunks(iterator,
+            **self._gfk_prefetch)
+
+    def _get_gfk_manager(self):
+        if self._gfk_manager is None:
+            raise ValueError("prefetch_gfk is only available on querysets "
+                "returned by a GFKManager of the model")
+        return self._gfk_manager
+
+    def __getstate__(self):
+        # The manager can't be pickled if its object cache holds locks, so
+        # only its name is stored and it is looked up again when unpickling
+        obj_dict = super(GFKQuerySet, self).__getstate__()
+        manager = obj_dict.pop('_gfk_manager', None)
+        obj_dict['_gfk_manager_name'] = getattr(manager, '_gfk_name', None)
+        return obj_dict
+
+    def __setstate__(self, obj_dict):
+        obj_dict = obj_dict.copy()
+        name = obj_dict.pop('_gfk_manager_name', None)
+        self.__dict__.update(obj_dict)
+        self._gfk_manager = None
+        if name is not None:
+            self._gfk_manager = getattr(self.model, name, None)
+
+    def _clone(self, klass=None, setup=False, **kwargs):
+        kwargs.setdefault('_gfk_manager', self._gfk_manager)
+        kwargs.setdefault('_gfk_prefetch', self._gfk_prefetch)
+        return super(GFKQuerySet, self)._clone(klass, setup, **kwargs)
 
 class GFKManager(models.Manager):
     """
     A simple manager that offers the usual stuff as well as a new method 
     ``relate``, that limits the number of required queries for generic
-    relationships.
+    relationships. Its querysets additionally offer a lazy variant of it
+    with ``prefetch_gfk``.
+
+    If you pass an ``object_cache`` (for instance a ``LocalObjectCache`` or a
+    ``DjangoObjectCache``), the related objects are looked up there first
+    and only the missing ones are fetched from the database. The objects
+    are cached per database they were read from. Objects of models loaded
+    with a spec (see below) might be incomplete or filtered, so they are
+    neither looked up in nor added to the object cache.
+
+    By default the related objects are loaded with all their columns and a
+    plain ``select_related()``. Through ``target_specs`` you can specify
+    per model how they should be loaded instead. It maps model classes (or
+    "app_label.modelname" strings) to dictionaries with the following
+    optional keys:
+
+    * ``only`` / ``defer``: field names passed to ``QuerySet.only`` or
+      ``QuerySet.defer``
+    * ``select_related``: a tuple of relations to follow (an empty tuple
+      disables ``select_related``, which is also the default as soon as a
+      spec exists for a model)
+    * ``manager``: the name of the manager to use instead of the default one
+    * ``queryset``: a queryset or a callable taking the model class and
+      returning one, to be used as base for the query
+
+    For example::
+
+        objects = GFKManager(target_specs={
+            Article: {'only': ('title', 'slug'), 'select_related': ('author',)},
+            'photos.photo': {'manager': 'public'},
+        })
     """
     def __init__(self, *args, **kwargs):
         if 'content_type_field' in kwargs.keys():
@@ -25,9 +488,27 @@ class GFKManager(models.Manager):
         else:
             self._object_id_field = 'object_id'
 
+        self._object_cache = kwargs.pop('object_cache', None)
+        self._target_specs = kwargs.pop('target_specs', None) or {}
+        # The attribute name on the model, used when unpickling querysets
+        self._gfk_name = None
+
         super(GFKManager, self).__init__(*args, **kwargs)
 
-    def relate(self, qs):
+    def contribute_to_class(self, model, name):
+        super(GFKManager, self).contribute_to_class(model, name)
+        self._gfk_name = name
+
+    def get_query_set(self):
+        qs = GFKQuerySet(self.model, using=self._db)
+        qs._gfk_manager = self
+        return qs
+
+    def prefetch_gfk(self, *args, **kwargs):
+        return self.get_query_set().prefetch_gfk(*args, **kwargs)
+
+    def relate(self, qs, batch_size=None, workers=None, specs=None,
+            using=None):
         """
         Queries for all distinct content types in the resultset all
         relevant objects and binds them to the original resultset.
@@ -39,27 +520,314 @@ class GFKManager(models.Manager):
 
         Usage::
             
-            items = GenericItem.objects.select_related('content_type').all()
+            items = GenericItem.objects.all()
             items = GenericItem.objects.relate(items)
             
-        When fetching the items, only select the related content types,
-        since otherwise you will end up with one extra query for each
-        item.
+        The content types are looked up through Django's content type
+        cache, so there is no need to select them along with the items.
+        If you pass a ``batch_size``, no query will contain more than this
+        number of object ids.
+
+        By passing the number of ``workers``, the queries for the different
+        content types are sent in parallel by as many threads, so that the
+        time spent waiting for the database approaches the one of the
+        slowest query instead of the sum of all of them. The threads are
+        taken from a pool shared by all the calls, which only grows to the
+        largest number of workers requested, and they keep their own
+        database connections open between the calls. As these are separate
+        connections, the workers can't see the rows written by an
+        uncommitted transaction of the calling thread. Therefore the queries
+        are sent one after the other in the calling thread whenever one of
+        the databases involved is under transaction management (for
+        instance within ``commit_on_success`` or the transaction middleware).
+
+        ``specs`` takes loading specifications for the related models in
+        the same format as the ``target_specs`` of the manager and
+        overrides them for this call.
+
+        The related objects of every content type are read from the
+        database the routers' ``db_for_read`` returns for their model. To
+        read from another database, pass its alias as ``using`` or a
+        function taking the model and the routed alias and returning the
+        alias to use, for instance to pick a read replica::
+
+            items = GenericItem.objects.relate(items,
+                using=lambda model, db: db + '_replica')
+
+        The queries are grouped per database. If ``workers`` are used and
+        the objects come from more than one database, every worker runs all
+        the queries of one database.
+
+        To verify the number of queries, connect to the ``relate_finished``
+        signal or use the ``track_relate`` and ``assert_relate_queries``
+        context managers, which receive a ``RelateStats`` for every call.
 
         You can find more details on:
         <http://zerokspot.com/weblog/2008/08/13/genericforeignkeys-with-less-queries/>
         """
-        model_map = {}
-        item_map = {}
-        for item in qs:
-            object_id = getattr(item, self._object_id_field)
-            content_type = getattr(item, self._content_type_field)
-            model_map.setdefault(content_type, {}) \
-                [object_id] = item.id
-            item_map[item.id] = item
-        for ct, items_ in model_map.items():
-            for o in ct.model_class().objects.select_related() \
-                    .filter(id__in=items_.keys()).all():
-                setattr(item_map[items_[o.id]],self._content_object_field, o)
+        self._relate_items(qs, batch_size=batch_size, workers=workers,
+            specs=specs, using=using)
         return qs
 
+    def relate_iterator(self, qs, chunk_size=1000, batch_size=500,
+            workers=None, specs=None, using=None):
+        """
+        Streaming variant of ``relate`` for huge resultsets. Instead of
+        loading the whole queryset at once, it is walked in chunks of
+        ``chunk_size`` items using ``QuerySet.iterator()``. The related
+        objects are fetched chunk by chunk with at most ``batch_size`` ids
+        per query, and every item is yielded with its content object
+        already attached::
+
+            items = GenericItem.objects.all()
+            for item in GenericItem.objects.relate_iterator(items):
+                print item.content_object
+
+        This way the memory consumption depends on the chunk size and no
+        longer on the size of the resultset (note that some database
+        drivers buffer the whole resultset of a query nonetheless).
+        ``workers``, ``specs`` and ``using`` work the same way as with
+        ``relate``.
+        """
+        return self._relate_chunks(qs.iterator(), chunk_size,
+            batch_size=batch_size, workers=workers, specs=specs, using=using)
+
+    def prefetch_for(self, objects, to_attr=None, qs=None, batch_size=None):
+        """
+        The reverse of ``relate``: loads the items of this manager's model
+        pointing at the given objects (a list or queryset, possibly of
+        different models) with one query per content type and attaches them
+        to every object as a list::
+
+            articles = Comment.objects.prefetch_for(Article.objects.all())
+            for article in articles:
+                print len(article.comment_list)
+
+        The lists are stored in the attribute ``to_attr``, which defaults to
+        the lowercased name of the model followed by "_list", and keep the
+        ordering of ``qs``. Pass a queryset of the model as ``qs`` to
+        restrict the items (for instance to public comments only). The
+        content object of every item is set to the object it was found for,
+        so accessing it doesn't cause any further queries. If you pass a
+        ``batch_size``, no query will contain more than this number of
+        object ids. Returns the objects as list.
+        """
+        (ct_field, object_id_field, object_field) = self._get_fields()
+        cache_attr = self._get_cache_attr(object_field)
+        if to_attr is None:
+            to_attr = '%s_list' % self.model._meta.object_name.lower()
+        if qs is None:
+            qs = self.get_query_set()
+        objects = list(objects)
+        targets = {}
+        for obj in objects:
+            setattr(obj, to_attr, [])
+            if obj.pk is None:
+                continue
+            ct = ContentType.objects.get_for_model(obj.__class__)
+            targets.setdefault(ct.id, {}).setdefault(obj.pk, []).append(obj)
+        for ct_id, objects_ in targets.items():
+            model = ContentType.objects.get_for_id(ct_id).model_class()
+            ids = objects_.keys()
+            step = batch_size or len(ids)
+            for offset in range(0, len(ids), step):
+                items = qs.filter(**{
+                    ct_field: ct_id,
+                    '%s__in' % object_id_field: ids[offset:offset+step],
+                })
+                for item in items:
+                    object_id = _pk_to_python(model,
+                        getattr(item, object_id_field))
+                    for obj in objects_.get(object_id, ()):
+                        getattr(obj, to_attr).append(item)
+                        setattr(item, cache_attr, obj)
+        return objects
+
+    def _get_fields(self, content_type_field=None, object_id_field=None,
+            content_object_field=None):
+        return (content_type_field or self._content_type_field,
+            object_id_field or self._object_id_field,
+            content_object_field or self._content_object_field)
+
+    def _get_cache_attr(self, object_field):
+        """
+        Returns the attribute the generic foreign key caches its object in.
+        The objects are bound through it instead of the descriptor, which
+        refuses objects from another database than the item's.
+        """
+        for field in self.model._meta.virtual_fields:
+            if field.name == object_field:
+                return getattr(field, 'cache_attr', object_field)
+        return object_field
+
+    def _relate_chunks(self, iterator, chunk_size, **options):
+        """
+        Takes the items from the iterator in chunks of ``chunk_size``,
+        binds their content objects and yields them.
+        """
+        chunk = []
+        for item in iterator:
+            chunk.append(item)
+            if len(chunk) >= chunk_size:
+                self._relate_items(chunk, **options)
+                for related in chunk:
+                    yield related
+                chunk = []
+        if chunk:
+            self._relate_items(chunk, **options)
+            for related in chunk:
+                yield related
+
+    def _relate_items(self, items, fields=None, batch_size=None,
+            workers=None, specs=None, using=None):
+        """
+        Binds the content objects to the given items with one query per
+        content type and batch of at most ``batch_size`` object ids. Objects
+        available in the object cache are not queried for. If there are
+        receivers for ``relate_finished``, the statistics are sent to them.
+        """
+        stats = None
+        if relate_finished.receivers:
+            stats = RelateStats(self.model)
+            start = default_timer()
+        (ct_field, object_id_field, object_field) = fields or self._get_fields()
+        ct_attname = self.model._meta.get_field(ct_field).attname
+        cache_attr = self._get_cache_attr(object_field)
+        cache = self._object_cache
+        model_map = {}
+        rows = 0
+        for item in items:
+            rows += 1
+            object_id = getattr(item, object_id_field)
+            ct_id = getattr(item, ct_attname)
+            model_map.setdefault(ct_id, {}) \
+                .setdefault(object_id, []).append(item)
+        batches = []
+        for ct_id, items_ in model_map.items():
+            model = ContentType.objects.get_for_id(ct_id).model_class()
+            # The object ids have to match the type of the primary keys
+            normalized = {}
+            for object_id, items__ in items_.items():
+                normalized.setdefault(_pk_to_python(model, object_id), []) \
+                    .extend(items__)
+            items_ = model_map[ct_id] = normalized
+            ids = items_.keys()
+            spec = self._get_target_spec(model, specs)
+            db = self._get_db(model, using)
+            if cache is not None and spec is None:
+                cache.watch(model)
+                cached = cache.get_many([(ct_id, id_, db) for id_ in ids])
+                for ((ct_id_, object_id, db_), o) in cached.items():
+                    for item in items_[object_id]:
+                        setattr(item, cache_attr, o)
+                ids = [id_ for id_ in ids if (ct_id, id_, db) not in cached]
+                if stats is not None:
+                    stats.add_cached(model, len(cached))
+                if not ids:
+                    continue
+            step = batch_size or len(ids)
+            for offset in range(0, len(ids), step):
+                batches.append((db, ct_id, model, ids[offset:offset+step],
+                    spec))
+        # Group the queries per database
+        batches.sort(key=lambda batch: batch[0])
+        calls = [(model, ids, spec, db)
+            for (db, ct_id, model, ids, spec) in batches]
+        databases = set([batch[0] for batch in batches])
+        if workers:
+            for db in databases:
+                if transaction.is_managed(using=db):
+                    workers = None
+                    break
+        fetch = self._fetch_objects
+        if stats is not None:
+            fetch = self._timed_fetch(stats)
+        if workers and len(databases) > 1:
+            groups = [[call for call in calls if call[3] == db]
+                for db in sorted(databases)]
+            results = []
+            for group_results in _run_in_threads(self._fetch_group,
+                    [(group, fetch) for group in groups], workers):
+                results.extend(group_results)
+        elif workers and len(calls) > 1:
+            results = _run_in_threads(fetch, calls, workers)
+        else:
+            results = [fetch(*args) for args in calls]
+        for ((db, ct_id, model, ids, spec), objects) in zip(batches, results):
+            items_ = model_map[ct_id]
+            fetched = {}
+            for o in objects:
+                for item in items_[o.pk]:
+                    setattr(item, cache_attr, o)
+                fetched[(ct_id, o.pk, db)] = o
+            if cache is not None and spec is None:
+                cache.set_many(fetched)
+        if stats is not None:
+            stats.rows = rows
+            stats.content_types = len(model_map)
+            stats.time = default_timer() - start
+            relate_finished.send(sender=self.model, stats=stats)
+
+    def _timed_fetch(self, stats):
+        """
+        Returns a variant of ``_fetch_objects`` recording every query in the
+        given stats.
+        """
+        fetch_objects = self._fetch_objects
+        def fetch(model, ids, spec=None, using=None):
+            start = default_timer()
+            objects = fetch_objects(model, ids, spec, using)
+            stats.add_query(model, using, len(objects),
+                default_timer() - start)
+            return objects
+        return fetch
+
+    def _get_target_spec(self, model, specs=None):
+        """
+        Returns the loading specification for the given model or None.
+        """
+        label = '%s.%s' % (model._meta.app_label, model._meta.object_name.lower())
+        for specs_ in (specs or {}, self._target_specs):
+            for key in (model, label):
+                if key in specs_:
+                    return specs_[key]
+        return None
+
+    def _get_db(self, model, using=None):
+        """
+        Returns the alias of the database the objects of ``model`` are read
+        from.
+        """
+        if using is not None and not callable(using):
+            return using
+        db = router.db_for_read(model)
+        if using is not None:
+            db = using(model, db)
+        return db
+
+    def _fetch_group(self, calls, fetch=None):
+        fetch = fetch or self._fetch_objects
+        return [fetch(*args) for args in calls]
+
+    def _fetch_objects(self, model, ids, spec=None, using=None):
+        if spec is None:
+            qs = model._default_manager.select_related()
+        else:
+            if 'queryset' in spec:
+                qs = spec['queryset']
+                if callable(qs):
+                    qs = qs(model)
+                qs = qs.all()
+            elif 'manager' in spec:
+                qs = getattr(model, spec['manager']).all()
+            else:
+                qs = model._default_manager.all()
+            if spec.get('select_related'):
+                qs = qs.select_related(*spec['select_related'])
+            if spec.get('only'):
+                qs = qs.only(*spec['only'])
+            if spec.get('defer'):
+                qs = qs.defer(*spec['defer'])
+        if using is not None:
+            qs = qs.using(using)
+        return list(qs.filter(pk__in=ids))
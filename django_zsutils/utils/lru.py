@@ -0,0 +1,154 @@
+"""
+A small, thread-safe and size-bounded LRU cache for process-wide lookup
+tables. Once the cache holds ``maxsize`` entries, every new entry evicts the
+one that has been used least recently::
+
+    from django_zsutils.utils.lru import LRUCache
+
+    cache = LRUCache(100)
+    cache.set('key', 'value')
+    cache.get('key')
+
+Entries can optionally expire after ``timeout`` seconds. Every instance
+counts its hits, misses and evictions, which are available through
+``LRUCache.stats()`` for monitoring purposes.
+"""
+
+import threading
+import time
+
+__all__ = ('LRUCache', )
+
+# Indices of the fields of a link in the cache's linked list
+_PREV, _NEXT, _KEY, _VALUE, _EXPIRES = 0, 1, 2, 3, 4
+
+class LRUCache(object):
+    """
+    Mapping of at most ``maxsize`` entries. The entries are kept in a
+    circular doubly linked list ordered by their last usage, so looking up,
+    adding and evicting entries are all constant time operations. A
+    ``maxsize`` of 0 disables the cache. If ``timeout`` is set, entries
+    older than this number of seconds are treated as missing.
+    """
+
+    def __init__(self, maxsize=128, timeout=None):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._map = {}
+        root = []
+        root[:] = [root, root, None, None, None]
+        self._root = root
+
+    def __len__(self):
+        return len(self._map)
+
+    def __contains__(self, key):
+        return key in self._map
+
+    def get(self, key, default=None):
+        """
+        Returns the value cached for ``key`` and marks it as recently used
+        or returns ``default`` if there is no such entry.
+        """
+        self._lock.acquire()
+        try:
+            link = self._map.get(key)
+            if link is not None and link[_EXPIRES] is not None \
+                    and link[_EXPIRES] <= time.time():
+                self._unlink(link)
+                del self._map[key]
+                link = None
+            if link is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._unlink(link)
+            self._append(link)
+            return link[_VALUE]
+        finally:
+            self._lock.release()
+
+    def set(self, key, value):
+        """
+        Caches ``value`` for ``key``, evicting the least recently used entry
+        if the cache is full.
+        """
+        if self.maxsize <= 0:
+            return
+        if self.timeout is None:
+            expires = None
+        else:
+            expires = time.time() + self.timeout
+        self._lock.acquire()
+        try:
+            link = self._map.get(key)
+            if link is not None:
+                self._unlink(link)
+                link[_VALUE] = value
+                link[_EXPIRES] = expires
+            else:
+                if len(self._map) >= self.maxsize:
+                    oldest = self._root[_NEXT]
+                    self._unlink(oldest)
+                    del self._map[oldest[_KEY]]
+                    self.evictions += 1
+                link = [None, None, key, value, expires]
+                self._map[key] = link
+            self._append(link)
+        finally:
+            self._lock.release()
+
+    def delete(self, key):
+        """
+        Removes the entry for ``key`` if there is one.
+        """
+        self._lock.acquire()
+        try:
+            link = self._map.pop(key, None)
+            if link is not None:
+                self._unlink(link)
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        """
+        Removes all entries. The statistics are left untouched.
+        """
+        self._lock.acquire()
+        try:
+            self._map.clear()
+            root = self._root
+            root[:] = [root, root, None, None, None]
+        finally:
+            self._lock.release()
+
+    def stats(self):
+        """
+        Returns a dictionary with the current size and the hit, miss and
+        eviction counters of this cache.
+        """
+        return {
+            'size': len(self._map),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+    def reset_stats(self):
+        self.hits = self.misses = self.evictions = 0
+
+    def _append(self, link):
+        root = self._root
+        last = root[_PREV]
+        link[_PREV] = last
+        link[_NEXT] = root
+        last[_NEXT] = root[_PREV] = link
+
+    def _unlink(self, link):
+        link[_PREV][_NEXT] = link[_NEXT]
+        link[_NEXT][_PREV] = link[_PREV]
@@ -26,12 +26,121 @@ View2, so you don't need to write it again.
 If you want to share some HttpResponse post-processing, implement the
 ``BaseView.__after__(self, response_obj)`` method
 
+Setup that only depends on the view class (compiling regular expressions,
+loading templates, ...) belongs into the ``__setup__`` classmethod, which
+``create_view`` calls once per class::
+
+    class View3(BaseView):
+        def __setup__(cls):
+            cls.template = loader.get_template('view3.html')
+        __setup__ = classmethod(__setup__)
+
+If a view doesn't keep any per-request state on its instance, set
+``stateless = True`` on its class. ``create_view`` then creates a single
+instance (passing None as request to ``__init__``) and uses it for all the
+requests, so the view has to be thread-safe.
+
+Streaming responses
+-------------------
+
+``__call__`` may return a response built from an iterator, which Django
+sends chunk by chunk (``HttpResponse(generate_rows())``). ``__after__``
+shouldn't touch the ``content`` of such a response, as that would load the
+whole body into memory. Instead, implement ``__filter__(self, response,
+chunks)``: a generator receiving the response and an iterator over its
+encoded chunks, yielding the transformed chunks::
+
+    class Export(BaseView):
+        def __filter__(self, response, chunks):
+            checksum = hashlib.md5()
+            for chunk in chunks:
+                checksum.update(chunk)
+                yield chunk
+            yield '# md5: %s\n' % checksum.hexdigest()
+
+For streaming responses, the filter is applied lazily while the body is
+sent, so only one chunk at a time has to be held in memory. For all the
+other responses, the filtered content is joined right away. Responses
+without a body (to HEAD requests or with the status 204 or 304) are never
+filtered, and the ones with a status other than 2xx only if the view sets
+``filter_errors = True``.
+
+The views created by ``create_view`` are plain synchronous WSGI views. This
+package targets Python 2 and Django versions without ASGI, so coroutine
+implementations of ``__call__`` or ``__after__`` are not supported.
+
+The time spent in the phases of every view can be recorded by enabling the
+``instrumentation`` module of this package.
+
 For more details check out this `blog post`_
 
 .. _blog post: http://zerokspot.com/weblog/1037/
 """
 
-__all__ = ('create_view', 'BaseView', )
+from timeit import default_timer
+
+from . import instrumentation
+
+__all__ = ('create_view', 'BaseView', 'is_streaming', 'filter_response', )
+
+def is_streaming(response):
+    """
+    Returns True if the content of the given response is an iterator, which
+    is only consumed when the response is sent.
+    """
+    streaming = getattr(response, 'streaming', None)
+    if streaming is not None:
+        return streaming
+    return not getattr(response, '_is_string', True)
+
+def _encoded_chunks(response, chunks):
+    for chunk in chunks:
+        if isinstance(chunk, unicode):
+            chunk = chunk.encode(response._charset)
+        yield str(chunk)
+
+class _FilteredContent(object):
+    """
+    Lazily filtered content of a streaming response, which also closes the
+    original content when the response gets closed.
+    """
+
+    def __init__(self, response, func):
+        self._original = response._container
+        self._filtered = func(response,
+            _encoded_chunks(response, self._original))
+
+    def __iter__(self):
+        return iter(self._filtered)
+
+    def close(self):
+        if hasattr(self._filtered, 'close'):
+            self._filtered.close()
+        if hasattr(self._original, 'close'):
+            self._original.close()
+
+def filter_response(response, func, request=None, filter_errors=False):
+    """
+    Passes the content of the response through the generator function
+    ``func(response, chunks)`` (see ``BaseView.__filter__``) and returns the
+    response. Responses to HEAD requests and the ones with the status 204 or
+    304 are returned unchanged, and so are the ones with a status other than
+    2xx unless ``filter_errors`` is True.
+    """
+    status = response.status_code
+    if status in (204, 304) or (request is not None
+            and request.method == 'HEAD'):
+        return response
+    if not filter_errors and not 200 <= status < 300:
+        return response
+    if is_streaming(response):
+        response._container = _FilteredContent(response, func)
+        if response.has_header('Content-Length'):
+            del response['Content-Length']
+    else:
+        response.content = ''.join(func(response,
+            _encoded_chunks(response, response._container)))
+    return response
 
 def create_view(klass):
     """
@@ -40,25 +149,115 @@ def create_view(klass):
     duck-type-compatible) and it will give you a function that you can 
     add to your urlconf.
     """
+    view_name = '%s.%s' % (klass.__module__, klass.__name__)
+    setup = getattr(klass, '__setup__', None)
+    if setup is not None and not klass.__dict__.get('_view_set_up', False):
+        setup()
+        klass._view_set_up = True
+    stateless = getattr(klass, 'stateless', False)
+    if stateless:
+        shared_instance = klass(None)
+        def get_instance(request, *args, **kwargs):
+            return shared_instance
+        # The methods of the shared instance only have to be looked up once
+        call = shared_instance.__call__
+        after = getattr(shared_instance, '__after__', None)
+        filter_ = getattr(shared_instance, '__filter__', None)
+        filter_errors = getattr(shared_instance, 'filter_errors', False)
+    else:
+        get_instance = klass
+
+    def _shared(request, *args, **kwargs):
+        """
+        Constructed function that executes the shared instance of your
+        stateless view.
+        """
+        if instrumentation.is_enabled():
+            return _instrumented(request, *args, **kwargs)
+        response = call(request, *args, **kwargs)
+        if after is not None:
+            response = after(response)
+        if filter_ is not None:
+            response = filter_response(response, filter_, request,
+                filter_errors)
+        return response
+
     def _func(request, *args, **kwargs):
         """
         Constructed function that actually creates and executes your view
         instance.
         """
-        view_instance = klass(request, *args, **kwargs)
+        if instrumentation.is_enabled():
+            return _instrumented(request, *args, **kwargs)
+        view_instance = get_instance(request, *args, **kwargs)
         response = view_instance(request, *args, **kwargs)
         after = getattr(view_instance, '__after__', None)
-        if after is None:
+        if after is not None:
+            response = view_instance.__after__(response)
+        if getattr(view_instance, '__filter__', None) is not None:
+            response = filter_response(response, view_instance.__filter__,
+                request, getattr(view_instance, 'filter_errors', False))
+        return response
+
+    def _instrumented(request, *args, **kwargs):
+        """
+        Same as ``_func``, but records the duration of every phase.
+        """
+        record = instrumentation.collector.record
+        start = default_timer()
+        try:
+            view_instance = get_instance(request, *args, **kwargs)
+            called = default_timer()
+            record(view_name, 'init', called - start)
+            try:
+                response = view_instance(request, *args, **kwargs)
+            finally:
+                after_start = default_timer()
+                record(view_name, 'call', after_start - called)
+                handler = getattr(request, 'ctn_handler', None)
+                if handler is not None:
+                    instrumentation.collector.record_handler(view_name,
+                        handler)
+            after = getattr(view_instance, '__after__', None)
+            filter_ = getattr(view_instance, '__filter__', None)
+            if after is not None or filter_ is not None:
+                try:
+                    if after is not None:
+                        response = view_instance.__after__(response)
+                    if filter_ is not None:
+                        response = filter_response(response, filter_,
+                            request, getattr(view_instance, 'filter_errors',
+                                False))
+                finally:
+                    record(view_name, 'after', default_timer() - after_start)
             return response
-        else:
-            return view_instance.__after__(response)
+        finally:
+            record(view_name, 'total', default_timer() - start)
+
+    if stateless:
+        return _shared
     return _func
 
 class BaseView(object):
     """
     The Base-class for OOPViews. Inherit it and overwrite the __init__, 
-    __call__ and/or __after__ methods.
+    __call__, __after__ and/or __filter__ methods.
     """
+    # If True, a single instance is shared between all the requests
+    stateless = False
+    # Generator method filtering the content of the responses chunk by chunk
+    # (see the module's documentation)
+    __filter__ = None
+    # If True, __filter__ is applied to responses with a non-2xx status too
+    filter_errors = False
+
+    def __setup__(cls):
+        """
+        Called once per view class by ``create_view``. Put the setup here
+        that doesn't depend on the request.
+        """
+        pass
+    __setup__ = classmethod(__setup__)
     
     def __init__(self, request, *args, **kwargs):
         """
@@ -37,11 +37,87 @@ will take the first element of that tuple as a priority value similar to the
 one used in the "Accept"-handling. This way, you can prioritize methods for 
 the case, that the user requests any type of a given family like for instance
 'text/*'.
+
+The binding is compiled into a dispatch table once, when the view class is
+created, so changing ``ctn_accept_binding`` on an existing class or instance
+has no effect. Define a subclass instead.
+
+The outcome of the negotiation is cached process-wide per view class and raw
+"Accept"-header, so that repeated headers don't have to be parsed again. The
+size of this LRU cache defaults to 256 entries and can be configured through
+settings.CTN_ACCEPT_CACHE_SIZE (0 disables it). Its hit, miss and eviction
+counters are available through ``get_accept_cache().stats()``. The name of
+the chosen handler is stored as ``request.ctn_handler`` (None if no handler
+was acceptable).
+
+As the view doesn't keep any per-request state on its instance, subclasses
+can be made ``stateless`` if their handlers don't either.
+
+Caching and conditional GET
+---------------------------
+
+All the responses of the view carry a "Vary: Accept"-header, so that caches
+keep the representations apart. Handlers can declare their cache timeout and
+validators with the ``ctn_cached`` decorator::
+
+    def news_last_modified(self, request, *args, **kwargs):
+        return NewsItem.objects.latest('changed').changed
+
+    class NewsView(ctn.AbstractCTNView):
+        ctn_accept_binding = {'text/html': 'html', '*/*': 'html'}
+
+        @ctn.ctn_cached(600, last_modified=news_last_modified)
+        def html(self, request, *args, **kwargs):
+            ...
+
+The ``etag`` and ``last_modified`` functions are called like the handler
+and return a string or a datetime respectively (or None). The name of the
+handler is appended to the ETag, as every representation needs its own
+one. For GET and HEAD requests, the view answers a matching
+"If-None-Match"- or "If-Modified-Since"-header with a 304 response before
+the handler is called. If a timeout is given, successful responses are
+stored in ``ctn_response_cache`` (Django's default cache if it is None) for
+that many seconds, keyed by the absolute URL, the handler and the
+validators, and get a corresponding "Cache-Control: max-age". Streaming
+responses only get the header, as storing them would consume their content.
+
+The cache key doesn't contain anything identifying the user, so responses
+that set cookies, vary on the "Cookie" header or were built using the session
+(and with it ``request.user``) or the flash messages are neither stored nor
+served from the cache, and they are marked as "private". Handlers reading
+``request.COOKIES`` or other per-user data directly have to take care of that
+themselves, for instance through ``vary_on_cookie``.
 """
 
-from django.http import HttpResponse
+import hashlib
+from calendar import timegm
+
+from django.conf import settings
+from django.core.cache import cache as default_cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.encoding import smart_str
+from django.utils.http import http_date, parse_http_date_safe, parse_etags, \
+    quote_etag
+
+from . import BaseView, is_streaming
+from ..flash import LazyFlash
+from ..lru import LRUCache
 
-from . import BaseView
+_MISSING = object()
+_accept_cache = None
+
+def get_accept_cache():
+    """
+    Returns the process-wide cache mapping (view class, "Accept"-header)
+    pairs to the name of the negotiated handler (or None if the request
+    is not acceptable).
+    """
+    global _accept_cache
+    if _accept_cache is None:
+        _accept_cache = LRUCache(int(getattr(settings,
+            'CTN_ACCEPT_CACHE_SIZE', 256)))
+    return _accept_cache
 
 
 def provides_priority_sorting(a,b):
@@ -83,93 +159,262 @@ def accept_priority_sorting(a,b):
         return -1
     return 0
 
+def parse_accept_header(accept):
+    """
+    Parses the value of an "Accept"-header into a list of ``(type, q)``
+    pairs sorted by ``accept_priority_sorting`` in descending order.
+    """
+    # Accept is basically a list separated by "," with options coming
+    # before the actual type and being separated by a ";" from it.
+    # For now, all this handles is the q-parameter which handles the 
+    # priority of the type. If not set, this is set to 1
+    types = []
+    for accepted_type in accept.split(","):
+        tinfo = accepted_type.split(";")
+        type_ = tinfo[0].lstrip().rstrip()
+        if len(tinfo) == 1:
+            q = 1
+        else:
+            parameters = [x.lstrip().rstrip() for x in tinfo[1].split(";")]
+            q = 1
+            for p in parameters:
+                if p.startswith("q="):
+                    try:
+                        q = float(p.split("=")[1])
+                    except ValueError:
+                        q = -1
+                    break
+            if q < 0 or q > 1:
+                continue
+        types.append((type_, q))
+    if len(types) > 0:
+        types.sort(accept_priority_sorting)
+        types.reverse()
+    else:
+        types.append(('*/*', 1))
+    return types
+
 class HttpResponseNotAcceptable(HttpResponse):
     status_code = 406
 
+def ctn_cached(timeout=None, etag=None, last_modified=None):
+    """
+    Decorator for the handlers of an ``AbstractCTNView`` declaring how long
+    their responses may be cached and the functions returning their ETag and
+    their last modification time.
+
+    The responses are cached per URL, not per user. Responses depending on
+    the session, the user or the flash messages, as well as the ones setting
+    cookies, aren't cached, but the view can't tell whether the handler used
+    ``request.COOKIES`` or other per-user data directly. Don't set a timeout
+    for such handlers (see the module's documentation).
+    """
+    def decorator(func):
+        func.ctn_cache_timeout = timeout
+        func.ctn_etag = etag
+        func.ctn_last_modified = last_modified
+        return func
+    return decorator
+
+class CTNDispatchTable(object):
+    """
+    Compiled form of a ``ctn_accept_binding``. It holds the handler bindings
+    sorted by ``provides_priority_sorting``, a map of every bound type to its
+    handler name and a map of every type family to the handler a
+    "family/*"-request should get. With these a request can be dispatched
+    with dictionary lookups alone.
+    """
+    __slots__ = ('priorities', 'exact', 'families')
+
+    def __init__(self, binding):
+        providing = []
+        for (type_, value) in binding.items():
+            if isinstance(value, (list, tuple)):
+                providing.append((type_, tuple(value)))
+            else:
+                providing.append((type_, (1, value)))
+        providing.sort(provides_priority_sorting)
+        providing.reverse()
+        self.priorities = tuple(providing)
+        self.exact = dict([(type_, value[1]) for (type_, value) in providing])
+        families = {}
+        for (type_, value) in providing:
+            (tfamily, sep, tspec) = type_.partition('/')
+            if sep:
+                families.setdefault(tfamily, value[1])
+        self.families = families
+
+    def resolve(self, types):
+        """
+        Returns the name of the handler for the first of the given
+        ``(type, q)`` pairs that can be served or None if none can.
+        """
+        exact = self.exact
+        families = self.families
+        for (type_, priority) in types:
+            (tfamily, sep, tspec) = type_.partition('/')
+            # If the requested type is a type-wildcard, we have to use the
+            # handler with the highest priority for this family, otherwise
+            # the type itself or its family-wildcard has to be bound.
+            if tspec == '*':
+                name = families.get(tfamily)
+            else:
+                name = exact.get(type_)
+                if name is None:
+                    name = exact.get(tfamily + '/*')
+            if name is not None:
+                return name
+        return None
+
+class CTNViewMeta(type):
+    """
+    Metaclass compiling the ``ctn_accept_binding`` of every view class into
+    a ``CTNDispatchTable``.
+    """
+    def __init__(cls, name, bases, attrs):
+        super(CTNViewMeta, cls).__init__(name, bases, attrs)
+        cls._ctn_dispatch = CTNDispatchTable(cls.ctn_accept_binding)
+
 class AbstractCTNView(BaseView):
+    __metaclass__ = CTNViewMeta
     ctn_accept_binding = {'*/*': 'default'}
+    # Cache for the responses of handlers with a timeout (None: the default
+    # cache)
+    ctn_response_cache = None
     
     def __init__(self, request, *args, **kwargs):
         if (self.__class__ is AbstractCTNView):
             raise TypeError, "AbstractContentSelectView is an abstract class"
-        self._ctn_request_priorities = None
-        self._ctn_provides_priorities = None
         super(AbstractCTNView, self).__init__(request, *args, **kwargs)
     
     def _ctn_build_provides_priorities(self):
-        
-        if self._ctn_provides_priorities is not None:
-            return self._ctn_provides_priorities
-        providing = []
-        for x in self.ctn_accept_binding.items():
-            if isinstance(x[1], list) or isinstance(x[1], tuple):
-                providing.append(x)
-            else:
-                providing.append((x[0], (1, x[1])))
-        providing.sort(provides_priority_sorting)
-        providing.reverse()
-        self._ctn_provides_priorities = providing
-        return providing
-
+        """
+        Returns the handler bindings of this view class ordered by their
+        priority.
+        """
+        return list(self._ctn_dispatch.priorities)
 
     def _ctn_build_request_priorities(self, request):
         """
         Helper method for building a priority list for all the content-types
         acceptable to the user.
         """
-        if self._ctn_request_priorities is not None:
-            return self._ctn_request_priorities
-
-        accept = request.META.get('HTTP_ACCEPT', "*/*")
-        # Accept is basically a list separated by "," with options coming
-        # before the actual type and being separated by a ";" from it.
-        # For now, all this handles is the q-parameter which handles the 
-        # priority of the type. If not set, this is set to 1
-        types = []
-        for accepted_type in accept.split(","):
-            tinfo = accepted_type.split(";")
-            type_ = tinfo[0].lstrip().rstrip()
-            if len(tinfo) == 1:
-                q = 1
-            else:
-                parameters = [x.lstrip().rstrip() for x in tinfo[1].split(";")]
-                q = 1
-                for p in parameters:
-                    if p.startswith("q="):
-                        q = float(p.split("=")[1])
-                        break
-                if q < 0 or q > 1:
-                    continue
-            types.append((type_, q))
-        if len(types) > 0:
-            types.sort(accept_priority_sorting)
-            types.reverse()
-        else:
-            types.append(('*/*', 1))
-        self._ctn_request_priorities = types 
+        # Cached on the request, so that shared instances of stateless views
+        # don't mix up the priorities of different requests
+        types = getattr(request, '_ctn_request_priorities', None)
+        if types is None:
+            accept = request.META.get('HTTP_ACCEPT', "*/*")
+            types = request._ctn_request_priorities = \
+                parse_accept_header(accept)
         return types
 
     def __call__(self, request, *args, **kwargs):
         """
         Main dispatcher for request.
         """
-        self._ctn_build_request_priorities(request)
-        self._ctn_build_provides_priorities()
-        for (type_, priority) in self._ctn_request_priorities:
-            (tfamily, tspec) = type_.split('/')
-            # If the requested type is a type-wildcard, we have to go through
-            # the local priority list, otherwise a normal lookup is enough.
-            if tspec is '*':
-                for binding in self._ctn_provides_priorities:
-                    if binding[0].startswith(tfamily+'/'):
-                        return getattr(self, binding[1][1])(request, *args, **kwargs)
-            else:                    
-                for t in (type_, '%s/*'%(tfamily,)):
-                    if t in self.ctn_accept_binding.keys():
-                        if isinstance(self.ctn_accept_binding[t], tuple):
-                            name = self.ctn_accept_binding[t][1]
-                        else:
-                            name = self.ctn_accept_binding[t]
-                        return getattr(self, name)(request, *args, **kwargs)
-        return HttpResponseNotAcceptable()
+        accept = request.META.get('HTTP_ACCEPT', "*/*")
+        cache = get_accept_cache()
+        key = (self.__class__, accept)
+        name = cache.get(key, _MISSING)
+        if name is _MISSING:
+            name = self._ctn_dispatch.resolve(parse_accept_header(accept))
+            cache.set(key, name)
+        request.ctn_handler = name
+        if name is None:
+            response = HttpResponseNotAcceptable()
+        else:
+            response = self._ctn_respond(name, request, *args, **kwargs)
+        patch_vary_headers(response, ('Accept', ))
+        return response
+
+    def _ctn_respond(self, name, request, *args, **kwargs):
+        """
+        Calls the handler with the given name, taking care of its caching
+        options.
+        """
+        handler = getattr(self, name)
+        timeout = getattr(handler, 'ctn_cache_timeout', None)
+        etag_func = getattr(handler, 'ctn_etag', None)
+        last_modified_func = getattr(handler, 'ctn_last_modified', None)
+        if request.method not in ('GET', 'HEAD') or (timeout is None
+                and etag_func is None and last_modified_func is None):
+            return handler(request, *args, **kwargs)
+
+        etag = last_modified = None
+        if etag_func is not None:
+            etag = etag_func(self, request, *args, **kwargs)
+            if etag is not None:
+                etag = '%s-%s' % (etag, name)
+        if last_modified_func is not None:
+            dt = last_modified_func(self, request, *args, **kwargs)
+            if dt is not None:
+                last_modified = timegm(dt.utctimetuple())
+        if self._ctn_not_modified(request, etag, last_modified):
+            response = HttpResponseNotModified()
+        else:
+            response = None
+            if timeout is not None:
+                cache = self.ctn_response_cache or default_cache
+                key = 'zsutils.ctn.response:%s' % hashlib.md5(smart_str(repr((
+                    self.__class__.__module__, self.__class__.__name__,
+                    request.build_absolute_uri(), name, etag,
+                    last_modified)))).hexdigest()
+                response = cache.get(key)
+            if response is None:
+                response = handler(request, *args, **kwargs)
+                if timeout is not None and response.status_code == 200:
+                    if self._ctn_is_personal(request, response):
+                        patch_cache_control(response, private=True,
+                            max_age=timeout)
+                    else:
+                        patch_cache_control(response, max_age=timeout)
+                        # Streaming content can't be stored without
+                        # consuming it
+                        if not is_streaming(response):
+                            cache.set(key, response, timeout)
+        if etag is not None and not response.has_header('ETag'):
+            response['ETag'] = quote_etag(etag)
+        if last_modified is not None \
+                and not response.has_header('Last-Modified'):
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def _ctn_is_personal(self, request, response):
+        """
+        Returns True if the response is meant for the current user only:
+        it sets cookies, varies on them or the session or the flash
+        messages have been used to build it.
+        """
+        if response.cookies:
+            return True
+        if 'cookie' in response.get('Vary', '').lower():
+            return True
+        if getattr(getattr(request, 'session', None), 'accessed', False):
+            return True
+        flash = getattr(request, 'flash', None)
+        if isinstance(flash, LazyFlash) and (flash._loaded or len(flash)):
+            return True
+        return False
+
+    def _ctn_not_modified(self, request, etag, last_modified):
+        """
+        Returns True if the conditional headers of the request match the
+        given validators. "If-None-Match" takes precedence over
+        "If-Modified-Since".
+        """
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            if etag is None:
+                return False
+            try:
+                etags = parse_etags(if_none_match)
+            except ValueError:
+                return False
+            return etag in etags or '*' in etags
+        if_modified_since = request.META.get('HTTP_IF_MODIFIED_SINCE')
+        if if_modified_since and last_modified is not None:
+            if_modified_since = parse_http_date_safe(if_modified_since)
+            return if_modified_since is not None \
+                and last_modified <= if_modified_since
+        return False
 
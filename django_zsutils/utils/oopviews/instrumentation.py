@@ -0,0 +1,199 @@
+"""
+Opt-in timing instrumentation for the views built by ``create_view``. If
+enabled, the wall time of every phase of a view (``__init__``, ``__call__``
+and ``__after__``, plus the total) is recorded per view class in a
+process-wide collector. For content type negotiating views, the handler
+that has been chosen is counted as well.
+
+Enable it through settings.OOPVIEWS_INSTRUMENTATION or at runtime::
+
+    from django_zsutils.utils.oopviews import instrumentation
+
+    instrumentation.enable()
+    ...
+    instrumentation.collector.snapshot()
+
+The snapshot maps the dotted name of every view class to its phases and
+negotiated handlers::
+
+    {'myapp.views.NewsView': {
+        'phases': {'call': {'count': 10, 'total': 0.12, 'min': 0.009,
+            'max': 0.02, 'mean': 0.012, 'p50': 0.0164, 'p90': 0.0328,
+            'p99': 0.0328}, ...},
+        'handlers': {'html': 8, 'json': 2}}}
+
+The durations are in seconds. To keep recording cheap, they are sorted into
+exponential buckets, so the percentiles are upper bounds with a precision of
+a factor of two. Functions registered through ``collector.add_exporter``
+are called with a snapshot on every ``collector.export()``, which is the
+hook for sending the numbers to a metrics system.
+"""
+
+import threading
+from bisect import bisect_left
+
+from django.conf import settings
+
+__all__ = ('Histogram', 'Collector', 'collector', 'enable', 'disable',
+    'is_enabled', )
+
+PHASES = ('init', 'call', 'after', 'total')
+
+# Upper bounds of the histogram buckets in seconds: 25us doubled up to ~52s
+BUCKETS = tuple([0.000025 * 2 ** i for i in range(22)])
+
+class Histogram(object):
+    """
+    Counts durations in the exponential ``BUCKETS``, the last bucket taking
+    everything above the highest bound.
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, fraction):
+        """
+        Returns the upper bound of the bucket containing the given fraction
+        (between 0 and 1) of the values, but never more than the maximum.
+        """
+        if not self.count:
+            return None
+        needed = fraction * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= needed:
+                if i < len(BUCKETS):
+                    return min(BUCKETS[i], self.max)
+                break
+        return self.max
+
+    def as_dict(self):
+        mean = None
+        if self.count:
+            mean = self.total / self.count
+        return {
+            'count': self.count,
+            'total': self.total,
+            'min': self.min,
+            'max': self.max,
+            'mean': mean,
+            'p50': self.percentile(0.5),
+            'p90': self.percentile(0.9),
+            'p99': self.percentile(0.99),
+        }
+
+class Collector(object):
+    """
+    Thread-safe store of the phase histograms and handler counters of all
+    the instrumented view classes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+        self._exporters = []
+
+    def _get_view(self, view):
+        data = self._views.get(view)
+        if data is None:
+            data = self._views[view] = ({}, {})
+        return data
+
+    def record(self, view, phase, duration):
+        """
+        Adds the ``duration`` (in seconds) of a phase of the given view.
+        """
+        self._lock.acquire()
+        try:
+            phases = self._get_view(view)[0]
+            histogram = phases.get(phase)
+            if histogram is None:
+                histogram = phases[phase] = Histogram()
+            histogram.add(duration)
+        finally:
+            self._lock.release()
+
+    def record_handler(self, view, handler):
+        """
+        Counts that the negotiation of the given view chose ``handler``.
+        """
+        self._lock.acquire()
+        try:
+            handlers = self._get_view(view)[1]
+            handlers[handler] = handlers.get(handler, 0) + 1
+        finally:
+            self._lock.release()
+
+    def snapshot(self):
+        """
+        Returns the collected data of all views as a dictionary.
+        """
+        self._lock.acquire()
+        try:
+            return dict([(view, {
+                'phases': dict([(phase, histogram.as_dict())
+                    for (phase, histogram) in phases.items()]),
+                'handlers': dict(handlers),
+            }) for (view, (phases, handlers)) in self._views.items()])
+        finally:
+            self._lock.release()
+
+    def reset(self):
+        self._lock.acquire()
+        try:
+            self._views = {}
+        finally:
+            self._lock.release()
+
+    def add_exporter(self, exporter):
+        """
+        Registers a callable that ``export`` passes the snapshot to.
+        """
+        self._exporters.append(exporter)
+
+    def remove_exporter(self, exporter):
+        self._exporters.remove(exporter)
+
+    def export(self, reset=False):
+        """
+        Passes a snapshot to all the registered exporters and optionally
+        resets the collected data afterwards.
+        """
+        data = self.snapshot()
+        if reset:
+            self.reset()
+        for exporter in self._exporters:
+            exporter(data)
+        return data
+
+collector = Collector()
+
+_enabled = None
+
+def is_enabled():
+    global _enabled
+    if _enabled is None:
+        _enabled = bool(getattr(settings, 'OOPVIEWS_INSTRUMENTATION', False))
+    return _enabled
+
+def enable():
+    global _enabled
+    _enabled = True
+
+def disable():
+    global _enabled
+    _enabled = False
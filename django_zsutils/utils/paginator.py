@@ -0,0 +1,307 @@
+"""
+Paginators complementing the ones in ``django.core.paginator``.
+
+``KeysetPaginator`` implements keyset (or "seek") pagination: instead of
+counting all the rows and skipping to an offset, every page is fetched by
+filtering on the ordering key of the last (or first) item of the page
+before. This way, deep pages are as cheap as the first one as long as the
+ordering fields are indexed::
+
+    paginator = KeysetPaginator(NewsItem.objects.all(), 20,
+        ordering=('-pub_date', ))
+    page = paginator.page(request.GET.get('cursor'))
+
+A page doesn't know its number or the total number of pages, but it offers
+opaque ``next_cursor`` and ``previous_cursor`` values to get to its
+neighbours. The ``keyset_pagination`` tag in ``zsutils.pagination`` renders
+the links for them.
+
+If you stay with offset-based pagination, ``CachedCountPaginator`` avoids
+running a ``COUNT(*)`` on every request by caching the number of rows in
+Django's cache. Optionally it uses the database's estimate if that is above
+a given threshold (currently only available for PostgreSQL)::
+
+    paginator = CachedCountPaginator(NewsItem.objects.all(), 20,
+        cache_timeout=600, estimate_threshold=100000)
+
+The ``pagination`` tag shows totals based on an estimate as approximate.
+"""
+
+import base64
+import re
+import hashlib
+
+from django.core.cache import cache as default_cache
+from django.core.paginator import InvalidPage, EmptyPage, PageNotAnInteger, \
+    Page, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.encoding import smart_str, smart_unicode
+
+try:
+    import json
+except ImportError:
+    from django.utils import simplejson as json
+
+__all__ = ('KeysetPaginator', 'KeysetPage', 'InvalidCursor',
+    'CachedCountPaginator', 'EstimatedPage', )
+
+class InvalidCursor(InvalidPage):
+    pass
+
+class KeysetPaginator(object):
+    """
+    Paginator seeking on the given ``ordering`` (a sequence of field names
+    of the model, optionally prefixed with "-" for descending order). If
+    the ordering doesn't already end with the primary key, it is appended
+    to make the ordering unique. None of the ordering fields may be NULL.
+    """
+
+    def __init__(self, object_list, per_page, ordering=None):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        model = object_list.model
+        if ordering is None:
+            ordering = object_list.query.order_by or model._meta.ordering
+        ordering = list(ordering)
+        pk_name = model._meta.pk.name
+        if not ordering or ordering[-1].lstrip('-') not in ('pk', pk_name):
+            ordering.append('pk')
+        self.ordering = tuple(ordering)
+        self._fields = []
+        for name in ordering:
+            descending = name.startswith('-')
+            name = name.lstrip('-')
+            if name == 'pk':
+                field = model._meta.pk
+            else:
+                field = model._meta.get_field(name)
+            self._fields.append((field, descending))
+
+    def page(self, cursor=None):
+        """
+        Returns the page the given cursor points to or the first page if
+        no cursor is given. Raises ``InvalidCursor`` for malformed cursors.
+        """
+        if not cursor:
+            return self._make_page(self.object_list.order_by(*self.ordering),
+                False, False)
+        (direction, values) = self._decode_cursor(cursor)
+        if direction == 'n':
+            qs = self.object_list.filter(self._seek_filter(values, False)) \
+                .order_by(*self.ordering)
+            return self._make_page(qs, False, True)
+        reversed_ordering = [name.startswith('-') and name[1:] or '-' + name
+            for name in self.ordering]
+        qs = self.object_list.filter(self._seek_filter(values, True)) \
+            .order_by(*reversed_ordering)
+        return self._make_page(qs, True, True)
+
+    def _make_page(self, qs, backwards, has_other):
+        objects = list(qs[:self.per_page + 1])
+        has_more = len(objects) > self.per_page
+        objects = objects[:self.per_page]
+        if backwards:
+            objects.reverse()
+            return KeysetPage(objects, self, has_more, has_other)
+        return KeysetPage(objects, self, has_other, has_more)
+
+    def _seek_filter(self, values, backwards):
+        """
+        Builds the filter for all the rows coming after (or before) the
+        given values in the paginator's ordering.
+        """
+        result = None
+        for i, (field, descending) in enumerate(self._fields):
+            lookup = (descending != backwards) and 'lt' or 'gt'
+            condition = dict([(f.attname, v) for ((f, d), v)
+                in zip(self._fields[:i], values[:i])])
+            condition['%s__%s' % (field.attname, lookup)] = values[i]
+            if result is None:
+                result = Q(**condition)
+            else:
+                result |= Q(**condition)
+        return result
+
+    def _encode_cursor(self, direction, obj):
+        values = [smart_unicode(getattr(obj, field.attname))
+            for (field, descending) in self._fields]
+        data = json.dumps([direction] + values, separators=(',', ':'))
+        return base64.urlsafe_b64encode(smart_str(data)).rstrip('=')
+
+    def _decode_cursor(self, cursor):
+        try:
+            cursor = str(cursor)
+            data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            data = json.loads(data)
+            direction = data[0]
+            values = [field.to_python(value) for ((field, descending), value)
+                in zip(self._fields, data[1:])]
+        except Exception:
+            raise InvalidCursor('Invalid cursor')
+        if direction not in ('n', 'p') or len(values) != len(self._fields):
+            raise InvalidCursor('Invalid cursor')
+        return (direction, values)
+
+class KeysetPage(object):
+    """
+    A single page of a ``KeysetPaginator``.
+    """
+
+    def __init__(self, object_list, paginator, has_previous, has_next):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_previous = has_previous
+        self._has_next = has_next
+
+    def __repr__(self):
+        return '<KeysetPage of %d objects>' % len(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self._has_next and len(self.object_list) > 0
+
+    def has_previous(self):
+        return self._has_previous and len(self.object_list) > 0
+
+    def has_other_pages(self):
+        return self.has_previous() or self.has_next()
+
+    def next_cursor(self):
+        if not self.has_next():
+            return None
+        return self.paginator._encode_cursor('n', self.object_list[-1])
+
+    def previous_cursor(self):
+        if not self.has_previous():
+            return None
+        return self.paginator._encode_cursor('p', self.object_list[0])
+
+class CachedCountPaginator(Paginator):
+    """
+    Paginator caching the number of objects for ``cache_timeout`` seconds,
+    keyed by the SQL and parameters of the counted query. If
+    ``estimate_threshold`` is set and the database's planner estimates more
+    rows than that, the estimate is used instead of counting and
+    ``count_is_estimate`` is set to True.
+
+    As the estimate may be too low or too high, it isn't used to validate
+    page numbers then: a page is only empty if there are no objects at its
+    offset, and ``page`` returns an ``EstimatedPage`` which knows whether
+    there is a next page by fetching one object more than it shows. Orphans
+    aren't merged into the last page in this case.
+    """
+
+    def __init__(self, object_list, per_page, orphans=0,
+            allow_empty_first_page=True, cache_timeout=300,
+            estimate_threshold=None, cache=None):
+        super(CachedCountPaginator, self).__init__(object_list, per_page,
+            orphans, allow_empty_first_page)
+        self.cache_timeout = cache_timeout
+        self.estimate_threshold = estimate_threshold
+        self.cache = cache or default_cache
+        self.count_is_estimate = False
+
+    def _get_count(self):
+        if self._count is None:
+            query = self._get_query()
+            if query is None:
+                return super(CachedCountPaginator, self)._get_count()
+            key = 'zsutils.paginator.count:%s' % hashlib.md5(
+                smart_str(repr(query))).hexdigest()
+            cached = self.cache.get(key)
+            if cached is None:
+                count = None
+                if self.estimate_threshold is not None:
+                    count = self._estimate_count(*query)
+                    if count is None or count <= self.estimate_threshold:
+                        count = None
+                if count is None:
+                    cached = (self.object_list.count(), False)
+                else:
+                    cached = (count, True)
+                self.cache.set(key, cached, self.cache_timeout)
+            (self._count, self.count_is_estimate) = cached
+        return self._count
+    count = property(_get_count)
+
+    def validate_number(self, number):
+        self._get_count()
+        if not self.count_is_estimate:
+            return super(CachedCountPaginator, self).validate_number(number)
+        try:
+            number = int(number)
+        except ValueError:
+            raise PageNotAnInteger('That page number is not an integer')
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if not self.count_is_estimate:
+            return super(CachedCountPaginator, self).page(number)
+        bottom = (number - 1) * self.per_page
+        object_list = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not object_list and (number > 1
+                or not self.allow_empty_first_page):
+            raise EmptyPage('That page contains no results')
+        return EstimatedPage(object_list[:self.per_page], number, self,
+            len(object_list) > self.per_page)
+
+    def _get_query(self):
+        """
+        Returns the database alias, SQL and parameters of the object list or
+        None if it isn't a queryset.
+        """
+        query = getattr(self.object_list, 'query', None)
+        if query is None:
+            return None
+        using = self.object_list.db
+        (sql, params) = query.get_compiler(using).as_sql()
+        return (using, sql, tuple(params))
+
+    def _estimate_count(self, using, sql, params):
+        """
+        Returns the planner's estimate of the number of rows the query
+        returns or None if the database doesn't offer one.
+        """
+        connection = connections[using]
+        if connection.vendor != 'postgresql':
+            return None
+        cursor = connection.cursor()
+        cursor.execute('EXPLAIN ' + sql, params)
+        match = _ESTIMATE_RE.search(cursor.fetchone()[0])
+        if match is None:
+            return None
+        return int(match.group(1))
+
+class EstimatedPage(Page):
+    """
+    Page of a ``CachedCountPaginator`` whose number of objects is only
+    estimated. Whether there is a next page and the indexes of its objects
+    are determined from the objects of the page instead of the estimate.
+    """
+
+    def __init__(self, object_list, number, paginator, has_next):
+        super(EstimatedPage, self).__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+    def start_index(self):
+        if not self.object_list:
+            return 0
+        return (self.number - 1) * self.paginator.per_page + 1
+
+    def end_index(self):
+        return (self.number - 1) * self.paginator.per_page \
+            + len(self.object_list)
+
+_ESTIMATE_RE = re.compile(r' rows=(\d+) ')
@@ -0,0 +1,14 @@
+from django.db import connections
+
+_old_database_names = {}
+
+def setup():
+    for alias in connections:
+        connection = connections[alias]
+        _old_database_names[alias] = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0)
+
+def teardown():
+    for alias in connections:
+        connections[alias].creation.destroy_test_db(
+            _old_database_names[alias], verbosity=0)
@@ -0,0 +1,48 @@
+"""
+Models used by the tests of django_zsutils
+"""
+
+from django.db import models
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.contenttypes import generic
+
+from tagging.fields import TagField
+
+from django_zsutils.utils.generic import GFKManager, LocalObjectCache
+
+class Article(models.Model):
+    title = models.CharField(max_length=100)
+    body = models.TextField(blank=True)
+
+class Photo(models.Model):
+    title = models.CharField(max_length=100)
+
+class Entry(models.Model):
+    title = models.CharField(max_length=100)
+    tags = TagField()
+
+class Activity(models.Model):
+    content_type = models.ForeignKey(ContentType)
+    object_id = models.PositiveIntegerField()
+    content_object = generic.GenericForeignKey()
+
+    objects = GFKManager()
+    cached = GFKManager(object_cache=LocalObjectCache(maxsize=100))
+
+    class Meta:
+        ordering = ('id', )
+
+class Page(models.Model):
+    slug = models.SlugField(primary_key=True)
+    title = models.CharField(max_length=100)
+
+class Note(models.Model):
+    content_type = models.ForeignKey(ContentType)
+    object_id = models.CharField(max_length=50)
+    content_object = generic.GenericForeignKey()
+    text = models.CharField(max_length=100)
+
+    objects = GFKManager()
+
+    class Meta:
+        ordering = ('id', )
@@ -0,0 +1,7 @@
+from django.conf.urls.defaults import patterns, url
+
+from .urls import tag_detail
+
+urlpatterns = patterns('',
+    url(r'^tags/(?P<tag>[^/]+)/$', tag_detail, name='blog-tag'),
+)
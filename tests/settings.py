@@ -0,0 +1,30 @@
+from os.path import dirname, join
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': join(dirname(__file__), 'test.db'),
+        'TEST_NAME': join(dirname(__file__), 'test.db'),
+    },
+    # Stand-ins for further databases and read replicas
+    'archive': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': join(dirname(__file__), 'test_archive.db'),
+        'TEST_NAME': join(dirname(__file__), 'test_archive.db'),
+    },
+    'archive_replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': join(dirname(__file__), 'test_archive_replica.db'),
+        'TEST_NAME': join(dirname(__file__), 'test_archive_replica.db'),
+    },
+}
+
+INSTALLED_APPS = (
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django_zsutils',
+    'tagging',
+    'tests',
+)
+
+ROOT_URLCONF = 'tests.urls'
@@ -2,6 +2,9 @@
 Test module for oopviews.ctn related stuff
 """
 
+import datetime
+
+from django.core.cache import cache as default_cache
 from django.http import HttpResponse
 
 import sys
@@ -25,6 +28,52 @@ class DummyView(ctn.AbstractCTNView):
     def text_default(self, request, *args, **kwargs):
         return HttpResponse('text_default')
 
+def cached_etag(self, request, *args, **kwargs):
+    return self.version
+
+def cached_last_modified(self, request, *args, **kwargs):
+    return datetime.datetime(2011, 5, 1, 12, 0, 0)
+
+class CachedView(ctn.AbstractCTNView):
+    ctn_accept_binding = {
+        'text/html': 'html',
+        'application/json': 'json',
+        '*/*': 'html',
+    }
+    calls = 0
+    version = 'v1'
+
+    @ctn.ctn_cached(60, etag=cached_etag,
+        last_modified=cached_last_modified)
+    def html(self, request, *args, **kwargs):
+        CachedView.calls += 1
+        return HttpResponse('html %d' % self.calls)
+
+    @ctn.ctn_cached(last_modified=cached_last_modified)
+    def json(self, request, *args, **kwargs):
+        CachedView.calls += 1
+        return HttpResponse('json %d' % self.calls)
+
+class PersonalView(ctn.AbstractCTNView):
+    ctn_accept_binding = {'*/*': 'html'}
+    calls = 0
+
+    @ctn.ctn_cached(60)
+    def html(self, request, *args, **kwargs):
+        PersonalView.calls += 1
+        response = HttpResponse('html %d' % self.calls)
+        if request.GET.get('cookie'):
+            response.set_cookie('seen', '1')
+        if request.GET.get('session'):
+            request.session.get('user_id')
+        if request.GET.get('flash'):
+            request.flash.add_success('Saved')
+        return response
+
+def _cached_response(**headers):
+    request = utils.RequestFactory().get('/news/', **headers)
+    return CachedView(request)(request)
+
 def testAcceptOrdering():
     request = utils.RequestFactory().get('/', 
         HTTP_ACCEPT='text/plain, text/html;q=0.5, text/*')
@@ -68,3 +117,117 @@ def testHandlerLookupDefault():
     request = utils.RequestFactory().get('/')
     vo = DummyView(request)
     assert vo(request).content == 'default'
+
+def testDispatchTablePerClass():
+    class OtherView(DummyView):
+        ctn_accept_binding = {'application/json': 'default'}
+    assert DummyView._ctn_dispatch is not OtherView._ctn_dispatch
+    assert OtherView._ctn_dispatch.exact == {'application/json': 'default'}
+    assert DummyView._ctn_dispatch.families == {'text': 'text_html',
+                                                '*': 'default'}
+
+def testHandlerLookupFamilyWildcard():
+    request = utils.RequestFactory().get('/',
+            HTTP_ACCEPT='image/*, text/*')
+    vo = DummyView(request)
+    assert vo(request).content == 'text_html'
+
+def testHandlerLookupNotAcceptable():
+    request = utils.RequestFactory().get('/',
+            HTTP_ACCEPT='image/png, application')
+    vo = DummyView(request)
+    assert vo(request).status_code == 406
+
+def testInvalidPriorityValue():
+    priorities = ctn.parse_accept_header('text/plain;q=high, text/html')
+    assert priorities == [('text/html', 1)]
+
+def testAcceptCache():
+    cache = ctn.get_accept_cache()
+    cache.clear()
+    cache.reset_stats()
+    request = utils.RequestFactory().get('/', HTTP_ACCEPT='text/plain')
+    for i in range(3):
+        assert DummyView(request)(request).content == 'text_plain'
+    stats = cache.stats()
+    assert stats['misses'] == 1 and stats['hits'] == 2
+    assert cache.get((DummyView, 'text/plain')) == 'text_plain'
+
+def testAcceptCacheEviction():
+    from django_zsutils.utils.lru import LRUCache
+    cache = LRUCache(2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert 'b' not in cache and 'a' in cache and 'c' in cache
+    assert cache.stats()['evictions'] == 1
+
+def testVaryHeader():
+    request = utils.RequestFactory().get('/')
+    assert DummyView(request)(request)['Vary'] == 'Accept'
+    request = utils.RequestFactory().get('/', HTTP_ACCEPT='image/png')
+    assert DummyView(request)(request)['Vary'] == 'Accept'
+
+def testResponseCache():
+    default_cache.clear()
+    CachedView.calls = 0
+    for i in range(2):
+        response = _cached_response(HTTP_ACCEPT='text/html')
+        assert response.content == 'html 1'
+        assert response['ETag'] == '"v1-html"'
+        assert response['Last-Modified'] == 'Sun, 01 May 2011 12:00:00 GMT'
+        assert response['Cache-Control'] == 'max-age=60'
+        assert response['Vary'] == 'Accept'
+    # The JSON handler has no timeout, so its responses aren't cached
+    assert _cached_response(HTTP_ACCEPT='application/json').content == \
+        'json 2'
+    assert _cached_response(HTTP_ACCEPT='application/json').content == \
+        'json 3'
+    # A new ETag results in a new cache entry
+    CachedView.version = 'v2'
+    try:
+        response = _cached_response(HTTP_ACCEPT='text/html')
+    finally:
+        CachedView.version = 'v1'
+    assert response.content == 'html 4'
+    assert response['ETag'] == '"v2-html"'
+
+def _personal_response(**params):
+    from django.contrib.sessions.backends.db import SessionStore
+    from django_zsutils.utils.flash import LazyFlash
+    from django_zsutils.utils.flash.storage import CookieStorage
+    request = utils.RequestFactory().get('/personal/', params)
+    request.session = SessionStore()
+    request.flash = LazyFlash(CookieStorage(request))
+    return PersonalView(request)(request)
+
+def testPersonalResponsesNotCached():
+    default_cache.clear()
+    PersonalView.calls = 0
+    for params in ({'cookie': '1'}, {'session': '1'}, {'flash': '1'}):
+        for i in range(2):
+            response = _personal_response(**params)
+            assert response['Cache-Control'] in ('private, max-age=60',
+                'max-age=60, private')
+    assert PersonalView.calls == 6
+    assert _personal_response()['Cache-Control'] == 'max-age=60'
+    assert _personal_response().content == 'html 7'
+
+def testConditionalGet():
+    default_cache.clear()
+    CachedView.calls = 0
+    response = _cached_response(HTTP_IF_NONE_MATCH='"v1-html"')
+    assert response.status_code == 304
+    assert response['ETag'] == '"v1-html"'
+    assert response['Vary'] == 'Accept'
+    response = _cached_response(HTTP_IF_NONE_MATCH='"v0-html"',
+        HTTP_IF_MODIFIED_SINCE='Sun, 01 May 2011 12:00:00 GMT')
+    assert response.status_code == 200
+    response = _cached_response(HTTP_ACCEPT='application/json',
+        HTTP_IF_MODIFIED_SINCE='Sun, 01 May 2011 12:00:00 GMT')
+    assert response.status_code == 304
+    response = _cached_response(HTTP_ACCEPT='application/json',
+        HTTP_IF_MODIFIED_SINCE='Sun, 01 May 2011 11:59:59 GMT')
+    assert response.status_code == 200
+    assert CachedView.calls == 2
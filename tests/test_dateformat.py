@@ -0,0 +1,58 @@
+"""
+Test module for django_zsutils.utils.dateformat
+"""
+import datetime
+
+from django.test import TestCase
+from django.utils import dateformat as django_dateformat
+from django.utils.tzinfo import FixedOffset
+
+from django_zsutils.utils import dateformat
+from django_zsutils.templatetags.zsutils import datetime as datetime_filter
+
+# B (Swatch Internet time) isn't implemented by Django
+FORMAT_CHARS = 'aAbcdDEfFgGhHiIjlLmMnNOPrsStTUuwWyYzZ'
+
+VALUES = [
+    datetime.datetime(2011, 1, 1, 0, 0, 0),
+    datetime.datetime(2011, 3, 27, 12, 30, 5, 123),
+    datetime.datetime(2012, 2, 29, 23, 59, 59),
+    datetime.datetime(2011, 7, 4, 8, 0, 0, tzinfo=FixedOffset(-300)),
+    datetime.datetime(2010, 12, 31, 13, 5, 0, tzinfo=FixedOffset(60)),
+    datetime.date(2011, 10, 21),
+]
+
+class DateFormatTest(TestCase):
+
+    def assertSameFormat(self, format_string, values=VALUES):
+        expected = [django_dateformat.format(v, format_string) for v in values]
+        self.assertEqual([dateformat.format(v, format_string)
+            for v in values], expected)
+        self.assertEqual(dateformat.format_many(values, format_string),
+            expected)
+
+    def testSingleChars(self):
+        for char in FORMAT_CHARS:
+            # Dates don't have any of the time related fields
+            if char in 'aABcfgGhHiIOPrsTuUZ':
+                values = [v for v in VALUES if isinstance(v, datetime.datetime)]
+            else:
+                values = VALUES
+            self.assertSameFormat(char, values)
+
+    def testFormats(self):
+        self.assertSameFormat('N j, Y')
+        self.assertSameFormat(r'jS \o\f F Y, \a\t P', VALUES[:-1])
+        self.assertSameFormat(u'l, d.m.Y H:i:s O (T) \\\\ - \\Z', VALUES[:-1])
+        self.assertSameFormat('')
+
+    def testCompileCache(self):
+        self.assertTrue(dateformat.compile_format('Y-m-d') is
+            dateformat.compile_format('Y-m-d'))
+        self.assertFalse(dateformat.compile_format('Y-m-d').needs_timezone)
+        self.assertTrue(dateformat.compile_format('H:i T').needs_timezone)
+
+    def testFilter(self):
+        from django.conf import settings
+        self.assertEqual(datetime_filter(VALUES[1]),
+            django_dateformat.format(VALUES[1], settings.DATETIME_FORMAT))
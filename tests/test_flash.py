@@ -0,0 +1,143 @@
+"""
+Test module for django_zsutils.utils.flash
+"""
+
+import pickle
+
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore
+from django.http import HttpResponse
+from django.test import TestCase
+
+from django_zsutils.utils import flash
+from . import utils
+
+class FlashTestMixin(object):
+    storage = None
+
+    def setUp(self):
+        settings.FLASH_STORAGE = self.storage
+        flash._storage_class = None
+        self.middleware = flash.Middleware()
+
+    def tearDown(self):
+        del settings.FLASH_STORAGE
+        flash._storage_class = None
+
+    def _request(self, **extra):
+        request = utils.RequestFactory().get('/', **extra)
+        request.session = SessionStore()
+        self.middleware.process_request(request)
+        return request
+
+    def _messages(self, request):
+        return list(flash.context_processor(request)['flash'])
+
+class SessionFlashTest(FlashTestMixin, TestCase):
+    storage = 'django_zsutils.utils.flash.storage.SessionStorage'
+
+    def testUnusedFlash(self):
+        request = self._request()
+        flash.context_processor(request)
+        self.middleware.process_response(request, HttpResponse())
+        self.assertFalse(request.session.accessed)
+
+    def testRoundTrip(self):
+        request = self._request()
+        request.flash.add_success('Saved')
+        self.middleware.process_response(request, HttpResponse())
+        session = request.session
+
+        request = self._request()
+        request.session = session
+        self.assertEqual(self._messages(request),
+            [{'type': 'notice', 'msg': 'Saved'}])
+        self.middleware.process_response(request, HttpResponse())
+        self.assertFalse('_flash' in session)
+
+    def testLegacySession(self):
+        # Pickled by older versions, which stored Flash(dict) instances
+        legacy = ('\x80\x02cdjango_zsutils.utils.flash\nFlash\nq\x00)\x81q\x01('
+            'U\x04infoq\x02]q\x03U\x05Helloq\x04aU\x06noticeq\x05]q\x06U\x05'
+            'Savedq\x07au}q\x08b.')
+        request = self._request()
+        request.session['_flash'] = pickle.loads(legacy)
+        self.assertEqual(sorted(self._messages(request)),
+            [{'type': 'info', 'msg': 'Hello'},
+             {'type': 'notice', 'msg': 'Saved'}])
+        self.middleware.process_response(request, HttpResponse())
+        self.assertFalse('_flash' in request.session)
+
+class CookieFlashTest(FlashTestMixin, TestCase):
+    storage = 'django_zsutils.utils.flash.storage.CookieStorage'
+
+    def testRoundTrip(self):
+        request = self._request()
+        request.flash.add_warning('Careful')
+        response = self.middleware.process_response(request, HttpResponse())
+        cookie = response.cookies['flash'].value
+
+        request = self._request(HTTP_COOKIE='flash=%s' % cookie)
+        self.assertEqual(self._messages(request),
+            [{'type': 'warning', 'msg': 'Careful'}])
+        response = self.middleware.process_response(request, HttpResponse())
+        self.assertEqual(response.cookies['flash'].value, '')
+        self.assertFalse(request.session.accessed)
+
+    def testCookieSize(self):
+        request = self._request()
+        request.flash.add_success('First')
+        # Within FLASH_MAX_BYTES, but escaped and encoded far above 4 KB
+        self.assertTrue(request.flash.add_warning(u'\xfc' * 1000))
+        response = self.middleware.process_response(request, HttpResponse())
+        cookie = response.cookies['flash']
+        self.assertTrue(cookie['httponly'])
+        self.assertTrue(len(cookie.OutputString()) <= 4096)
+
+        request = self._request(HTTP_COOKIE='flash=%s' % cookie.value)
+        self.assertEqual(self._messages(request),
+            [{'type': 'notice', 'msg': 'First'}])
+
+    def testTamperedCookie(self):
+        request = self._request()
+        request.flash.add_warning('Careful')
+        response = self.middleware.process_response(request, HttpResponse())
+        cookie = response.cookies['flash'].value
+
+        request = self._request(HTTP_COOKIE='flash=x%s' % cookie)
+        self.assertEqual(self._messages(request), [])
+
+def testFlashLimits():
+    f = flash.Flash(max_messages=3, max_bytes=11)
+    assert f.add_success('one')
+    assert not f.add('notice', 'one')
+    assert f.add_failure('two')
+    assert not f.add_warning('way too long')
+    assert f.add_warning('three')
+    assert not f.add_warning('four')
+    assert list(f) == [{'type': 'notice', 'msg': 'one'},
+        {'type': 'failure', 'msg': 'two'}, {'type': 'warning', 'msg': 'three'}]
+    assert f['warning'] == ['three']
+
+def testFlashSerialization():
+    f = flash.Flash()
+    f.add_success(u'Gr\xfc\xdfe')
+    f.add(flash.FAILURE, 'Failed')
+    data = f.dumps()
+    assert data == '[[20,"Gr\\u00fc\\u00dfe"],[40,"Failed"]]'
+    assert list(flash.Flash.loads(data)) == list(f)
+    assert len(flash.Flash.loads('garbage')) == 0
+
+def testCustomTypes():
+    f = flash.Flash()
+    assert f.add('info', 'Hello')
+    assert not f.add('info', 'Hello')
+    assert f.add_success('Hello')
+    assert list(f) == [{'type': 'info', 'msg': 'Hello'},
+        {'type': 'notice', 'msg': 'Hello'}]
+    assert f.messages[0].level == flash.NOTICE
+    assert f['info'] == ['Hello'] and 'info' in f
+    assert f.keys() == ['info', 'notice']
+    data = f.dumps()
+    assert data == '[[20,"Hello","info"],[20,"Hello"]]'
+    assert list(flash.Flash.loads(data)) == list(f)
@@ -0,0 +1,463 @@
+"""
+Test module for django_zsutils.utils.generic
+"""
+from __future__ import with_statement
+
+import pickle
+import threading
+import time
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.paginator import Paginator
+from django.db import router
+from django.test import TestCase, TransactionTestCase
+
+from django_zsutils.utils import generic
+from django_zsutils.utils.generic import GFKQuerySet, relate_finished, \
+    track_relate, assert_relate_queries
+from .models import Article, Photo, Activity, Page, Note
+
+class RelateTest(TestCase):
+
+    def setUp(self):
+        self.articles = [Article.objects.create(title='Article %d' % i)
+            for i in range(5)]
+        self.photos = [Photo.objects.create(title='Photo %d' % i)
+            for i in range(3)]
+        for obj in self.articles + self.photos + self.articles[:2]:
+            Activity.objects.create(content_object=obj)
+
+    def testRelate(self):
+        qs = Activity.objects.select_related('content_type').all()
+        # 1 for the activities and 1 per content type
+        with self.assertNumQueries(3):
+            items = Activity.objects.relate(qs)
+            titles = [item.content_object.title for item in items]
+        self.assertEqual(len(titles), 10)
+        self.assertEqual(titles[-2:], ['Article 0', 'Article 1'])
+
+    def testRelateBatchSize(self):
+        qs = Activity.objects.select_related('content_type').all()
+        # 1 for the activities, 3 for the articles and 2 for the photos
+        with self.assertNumQueries(6):
+            items = Activity.objects.relate(qs, batch_size=2)
+            [item.content_object for item in items]
+
+    def testRelateIterator(self):
+        qs = Activity.objects.select_related('content_type').all()
+        # 1 for the activities and 1 per content type in each of the chunks
+        with self.assertNumQueries(1 + 1 + 2 + 1):
+            items = list(Activity.objects.relate_iterator(qs, chunk_size=4))
+            titles = [item.content_object.title for item in items]
+        self.assertEqual(len(titles), 10)
+        self.assertEqual(titles[:4], ['Article 0', 'Article 1',
+            'Article 2', 'Article 3'])
+
+    def testPrefetch(self):
+        qs = Activity.objects.prefetch_gfk().filter(id__gt=0)
+        with self.assertNumQueries(3):
+            titles = [item.content_object.title for item in qs]
+        self.assertEqual(len(titles), 10)
+
+    def testPrefetchPaginator(self):
+        paginator = Paginator(Activity.objects.prefetch_gfk(), 4)
+        paginator.count
+        # Only the 4 articles on the first page are loaded
+        with self.assertNumQueries(2):
+            page = paginator.page(1)
+            titles = [item.content_object.title for item in page.object_list]
+        self.assertEqual(titles, ['Article 0', 'Article 1', 'Article 2',
+            'Article 3'])
+
+    def testPickle(self):
+        qs = Activity.cached.prefetch_gfk().filter(id__gt=0)
+        Activity.cached._object_cache._cache.clear()
+        list(qs)
+        qs = pickle.loads(pickle.dumps(qs))
+        self.assertTrue(qs._gfk_manager is Activity.cached)
+        self.assertEqual(len(qs), 10)
+        # The content objects are taken from the manager's object cache
+        with self.assertNumQueries(1):
+            titles = [item.content_object.title for item in qs.all()]
+        self.assertEqual(titles[:2], ['Article 0', 'Article 1'])
+
+    def testWorkersWithinTransaction(self):
+        # The rows of this test aren't committed, so the workers couldn't
+        # see them and the queries have to be sent by this thread
+        threads = set()
+        fetch = Activity.objects._fetch_objects
+        def _fetch_objects(*args):
+            threads.add(threading.currentThread())
+            return fetch(*args)
+        Activity.objects._fetch_objects = _fetch_objects
+        try:
+            items = Activity.objects.relate(Activity.objects.all(),
+                batch_size=2, workers=3)
+        finally:
+            del Activity.objects._fetch_objects
+        self.assertEqual(threads, set([threading.currentThread()]))
+        self.assertEqual(items[0].content_object.title, 'Article 0')
+
+    def testPrefetchWithoutManager(self):
+        qs = GFKQuerySet(Activity)
+        self.assertRaises(ValueError, qs.prefetch_gfk)
+
+    def testRelateSpecs(self):
+        specs = {
+            Article: {'only': ('title', )},
+            'tests.photo': {'queryset': Photo.objects.filter(title='Photo 0')},
+        }
+        items = Activity.objects.relate(Activity.objects.all(), specs=specs)
+        article = items[0].content_object
+        self.assertEqual(article.title, 'Article 0')
+        self.assertTrue(article._deferred)
+        self.assertEqual(items[5].content_object.title, 'Photo 0')
+        # The other photos are not part of the queryset and so not bound
+        self.assertFalse(hasattr(items[6], '_content_object_cache'))
+
+class ReversePrefetchTest(TestCase):
+
+    def setUp(self):
+        self.articles = [Article.objects.create(title='Article %d' % i)
+            for i in range(4)]
+        self.photo = Photo.objects.create(title='Photo')
+        for obj in self.articles[:3] + [self.photo, self.articles[0]]:
+            Activity.objects.create(content_object=obj)
+
+    def testPrefetchFor(self):
+        # 1 query per content type
+        with self.assertNumQueries(2):
+            objects = Activity.objects.prefetch_for(
+                self.articles + [self.photo])
+            counts = [len(o.activity_list) for o in objects]
+            [a.content_object.title for o in objects for a in o.activity_list]
+        self.assertEqual(counts, [2, 1, 1, 0, 1])
+        self.assertTrue(objects[0].activity_list[0].content_object
+            is objects[0])
+        self.assertEqual([a.id for a in objects[0].activity_list],
+            sorted([a.id for a in objects[0].activity_list]))
+
+    def testPrefetchForQueryset(self):
+        first = Activity.objects.order_by('id')[0]
+        # 1 for the articles and 2 batches of activities
+        with self.assertNumQueries(3):
+            objects = Activity.objects.prefetch_for(Article.objects.all(),
+                to_attr='activities', batch_size=2,
+                qs=Activity.objects.exclude(pk=first.pk))
+        self.assertEqual([len(o.activities) for o in objects], [1, 1, 1, 0])
+
+    def testNonIntegerPrimaryKeys(self):
+        pages = [Page.objects.create(slug='page-%d' % i, title='Page %d' % i)
+            for i in range(3)]
+        article = self.articles[0]
+        for obj in pages + pages[:1]:
+            Note.objects.create(content_object=obj, text=obj.title)
+        Note.objects.create(
+            content_type=ContentType.objects.get_for_model(Article),
+            object_id=str(article.pk), text='Article')
+        with self.assertNumQueries(3):
+            notes = Note.objects.relate(Note.objects.all())
+            texts = [note.content_object.title for note in notes]
+        self.assertEqual(texts, ['Page 0', 'Page 1', 'Page 2', 'Page 0',
+            'Article 0'])
+        with self.assertNumQueries(2):
+            objects = Note.objects.prefetch_for(pages + [article])
+        self.assertEqual([len(o.note_list) for o in objects], [2, 1, 1, 1])
+
+class RelateStatsTest(TestCase):
+
+    def setUp(self):
+        Activity.cached._object_cache._cache.clear()
+        for i in range(3):
+            Activity.objects.create(
+                content_object=Article.objects.create(title='Article %d' % i))
+        Activity.objects.create(
+            content_object=Photo.objects.create(title='Photo'))
+
+    def testStats(self):
+        with track_relate() as calls:
+            Activity.objects.relate(Activity.objects.all(), batch_size=2)
+            Activity.cached.relate(Activity.objects.all())
+            Activity.cached.relate(Activity.objects.all())
+        self.assertEqual(len(calls), 3)
+        stats = calls[0]
+        self.assertEqual((stats.rows, stats.content_types, stats.queries,
+            stats.objects, stats.cached), (4, 2, 3, 4, 0))
+        data = stats.as_dict()
+        self.assertEqual(data['model'], 'tests.activity')
+        self.assertEqual(data['per_content_type']['tests.article']['queries'],
+            2)
+        self.assertEqual(data['per_content_type']['tests.photo']['database'],
+            'default')
+        self.assertTrue(data['time'] >= 0)
+        # The last call finds all the objects in the object cache
+        self.assertEqual((calls[2].queries, calls[2].cached), (0, 4))
+        self.assertFalse(relate_finished.receivers)
+
+    def _titles(self):
+        items = Activity.objects.relate(Activity.objects.all())
+        return [item.content_object.title for item in items]
+
+    def testAssertRelateQueries(self):
+        # 1 for the activities and 1 per content type
+        with assert_relate_queries(3):
+            self._titles()
+        with assert_relate_queries(0, using='archive'):
+            self._titles()
+        try:
+            with assert_relate_queries(3):
+                Activity.objects.relate(Activity.objects.all(), batch_size=1)
+        except AssertionError, e:
+            self.assertEqual(str(e), '5 queries executed (default: 5), '
+                'expected at most 3; relate issued 4 queries for 4 rows of '
+                '2 content types')
+        else:
+            self.fail('AssertionError not raised')
+
+    def testAssertRelateQueriesBrokenBinding(self):
+        # The objects are bound to an attribute the generic foreign key
+        # doesn't use, so it has to look them up one by one
+        Activity.objects._get_cache_attr = lambda object_field: '_broken'
+        try:
+            with assert_relate_queries(3):
+                self._titles()
+        except AssertionError, e:
+            self.assertTrue(str(e).startswith('7 queries executed'))
+        else:
+            self.fail('AssertionError not raised')
+        finally:
+            del Activity.objects._get_cache_attr
+
+    def testPrefetchStats(self):
+        with assert_relate_queries(3) as calls:
+            list(Activity.objects.prefetch_gfk(chunk_size=3))
+        self.assertEqual([stats.rows for stats in calls], [3, 1])
+
+class ParallelRelateTest(TransactionTestCase):
+    """
+    The worker threads use their own connections, so the test data has to
+    be committed to the (file-backed) test database.
+    """
+
+    def setUp(self):
+        for i in range(4):
+            Activity.objects.create(
+                content_object=Article.objects.create(title='Article %d' % i))
+            Activity.objects.create(
+                content_object=Photo.objects.create(title='Photo %d' % i))
+
+    def tearDown(self):
+        for model in (Activity, Article, Photo):
+            model.objects.all().delete()
+
+    def testParallelRelate(self):
+        threads = set()
+        calls = []
+        arrived = threading.Condition()
+        fetch = Activity.objects._fetch_objects
+        def _fetch_objects(*args):
+            # Every worker blocks in its first batch until all three workers
+            # hold one, so the batches can't be drained by a single thread.
+            # If they don't run in parallel, the wait times out instead of
+            # deadlocking and the assertions below fail.
+            arrived.acquire()
+            try:
+                threads.add(threading.currentThread())
+                calls.append(args)
+                arrived.notifyAll()
+                deadline = time.time() + 5
+                while len(threads) < 3 and time.time() < deadline:
+                    arrived.wait(deadline - time.time())
+            finally:
+                arrived.release()
+            return fetch(*args)
+        Activity.objects._fetch_objects = _fetch_objects
+        try:
+            items = Activity.objects.relate(Activity.objects.all(),
+                batch_size=2, workers=3)
+        finally:
+            del Activity.objects._fetch_objects
+        self.assertEqual([item.content_object.title for item in items],
+            ['Article 0', 'Photo 0', 'Article 1', 'Photo 1',
+             'Article 2', 'Photo 2', 'Article 3', 'Photo 3'])
+        self.assertTrue(threading.currentThread() not in threads)
+        self.assertEqual(len(threads), 3)
+        # 2 batches of articles and 2 of photos
+        self.assertEqual(len(calls), 4)
+
+    def testPoolReused(self):
+        calls = []
+        fetch = Activity.objects._fetch_objects
+        def _fetch_objects(*args):
+            calls.append(threading.currentThread())
+            return fetch(*args)
+        Activity.objects._fetch_objects = _fetch_objects
+        try:
+            for i in range(3):
+                Activity.objects.relate(Activity.objects.all(), workers=2)
+        finally:
+            del Activity.objects._fetch_objects
+        self.assertEqual(len(calls), 6)
+        # The threads outlive the calls and are shared between them
+        self.assertTrue(len(set(calls)) <= generic._pool.size)
+        for thread in calls:
+            self.assertTrue(thread.isAlive())
+
+    def testAssertRelateQueriesWithWorkers(self):
+        # The queries of the workers are sent through their own connections
+        with assert_relate_queries(3):
+            Activity.objects.relate(Activity.objects.all(), workers=2)
+        try:
+            with assert_relate_queries(2):
+                Activity.objects.relate(Activity.objects.all(), workers=2)
+        except AssertionError:
+            pass
+        else:
+            self.fail('AssertionError not raised')
+
+class ObjectCacheTest(TestCase):
+
+    def setUp(self):
+        Activity.cached._object_cache._cache.clear()
+        self.article = Article.objects.create(title='Article')
+        self.photo = Photo.objects.create(title='Photo')
+        for obj in (self.article, self.photo, self.article):
+            Activity.objects.create(content_object=obj)
+
+    def _titles(self):
+        qs = Activity.objects.select_related('content_type').all()
+        return [item.content_object.title
+            for item in Activity.cached.relate(qs)]
+
+    def testWarmCache(self):
+        self._titles()
+        with self.assertNumQueries(1):
+            titles = self._titles()
+        self.assertEqual(titles, ['Article', 'Photo', 'Article'])
+
+    def testInvalidation(self):
+        self._titles()
+        self.article.title = 'Changed'
+        self.article.save()
+        # Only the article has to be fetched again
+        with self.assertNumQueries(2):
+            titles = self._titles()
+        self.assertEqual(titles, ['Changed', 'Photo', 'Changed'])
+
+    def testSpecsBypassCache(self):
+        for i in range(2):
+            Activity.objects.create(
+                content_object=Article.objects.create(title='Other'))
+        Activity.cached.relate(Activity.objects.all(),
+            specs={'tests.article': {'only': ['id']}})
+        # The deferred articles must not be served from the cache, which
+        # would cost a query per article, while the photo has been cached
+        with self.assertNumQueries(2):
+            titles = self._titles()
+        self.assertEqual(titles, ['Article', 'Photo', 'Article', 'Other',
+            'Other'])
+
+class ArchiveRouter(object):
+    """
+    Routes the reads of photos to the "archive" database.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model is Photo:
+            return 'archive'
+        return None
+
+def use_replica(model, db):
+    if db == 'archive':
+        return 'archive_replica'
+    return db
+
+class MultiDBSetup(object):
+    """
+    The articles and activities live in the default database, the photos in
+    the "archive" one, which has a replica with different titles.
+    """
+    multi_db = True
+
+    def setUp(self):
+        self._routers = router.routers
+        router.routers = [ArchiveRouter()]
+        photo_ct = ContentType.objects.get_for_model(Photo)
+        for i in range(3):
+            Activity.objects.create(
+                content_object=Article.objects.create(title='Article %d' % i))
+            photo = Photo.objects.using('archive').create(
+                title='Photo %d' % i)
+            Photo.objects.using('archive_replica').create(pk=photo.pk,
+                title='Replica %d' % i)
+            Activity.objects.create(content_type=photo_ct, object_id=photo.pk)
+
+    def tearDown(self):
+        router.routers = self._routers
+
+    def _titles(self, **kwargs):
+        items = Activity.objects.relate(Activity.objects.all(), **kwargs)
+        return [item.content_object.title for item in items]
+
+class MultiDBRelateTest(MultiDBSetup, TestCase):
+
+    def testRouting(self):
+        with self.assertNumQueries(1, using='archive'):
+            with self.assertNumQueries(2):
+                with track_relate() as calls:
+                    titles = self._titles()
+        self.assertEqual(calls[0].per_content_type['tests.photo']['database'],
+            'archive')
+        self.assertEqual(titles, ['Article 0', 'Photo 0', 'Article 1',
+            'Photo 1', 'Article 2', 'Photo 2'])
+
+    def testReplicaPolicy(self):
+        with self.assertNumQueries(0, using='archive'):
+            with self.assertNumQueries(1, using='archive_replica'):
+                titles = self._titles(using=use_replica)
+        self.assertEqual(titles[:2], ['Article 0', 'Replica 0'])
+
+    def testUsing(self):
+        items = Activity.objects.relate(
+            Activity.objects.filter(content_type__model='photo'),
+            using='archive_replica')
+        self.assertEqual([item.content_object.title for item in items],
+            ['Replica 0', 'Replica 1', 'Replica 2'])
+
+    def testCachePerDatabase(self):
+        Activity.cached._object_cache._cache.clear()
+        qs = Activity.objects.filter(content_type__model='photo')
+        Activity.cached.relate(qs, using='archive_replica')
+        with self.assertNumQueries(1, using='archive'):
+            items = Activity.cached.relate(qs)
+        self.assertEqual([item.content_object.title for item in items],
+            ['Photo 0', 'Photo 1', 'Photo 2'])
+        with self.assertNumQueries(0, using='archive_replica'):
+            items = Activity.cached.relate(qs, using='archive_replica')
+        self.assertEqual(items[0].content_object.title, 'Replica 0')
+
+class ParallelMultiDBRelateTest(MultiDBSetup, TransactionTestCase):
+
+    def tearDown(self):
+        super(ParallelMultiDBRelateTest, self).tearDown()
+        for db in ('default', 'archive', 'archive_replica'):
+            for model in (Activity, Article, Photo):
+                model.objects.using(db).all().delete()
+
+    def testGroupedPerDatabase(self):
+        groups = []
+        fetch_group = Activity.objects._fetch_group
+        def _fetch_group(calls, *args):
+            groups.append((threading.currentThread(),
+                set([call[3] for call in calls])))
+            return fetch_group(calls, *args)
+        Activity.objects._fetch_group = _fetch_group
+        try:
+            titles = self._titles(batch_size=2, workers=4)
+        finally:
+            del Activity.objects._fetch_group
+        self.assertEqual(titles[:2], ['Article 0', 'Photo 0'])
+        self.assertEqual(sorted([dbs for (thread, dbs) in groups]),
+            [set(['archive']), set(['default'])])
+        self.assertTrue(threading.currentThread() not in
+            [thread for (thread, dbs) in groups])
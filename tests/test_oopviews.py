@@ -0,0 +1,295 @@
+"""
+Test module for oopviews.create_view and its instrumentation
+"""
+
+from django.http import HttpResponse, HttpResponseNotFound
+
+from django_zsutils.utils.oopviews import create_view, BaseView, ctn, \
+    is_streaming
+from django_zsutils.utils.oopviews import instrumentation
+from . import utils
+
+class PlainView(BaseView):
+    def __call__(self, request, *args, **kwargs):
+        return HttpResponse('plain')
+
+class FailingView(BaseView):
+    def __call__(self, request, *args, **kwargs):
+        raise ValueError
+
+class NegotiatingView(ctn.AbstractCTNView):
+    ctn_accept_binding = {
+        'text/html': 'html',
+        'application/json': 'json',
+    }
+
+    def html(self, request, *args, **kwargs):
+        return HttpResponse('html')
+    def json(self, request, *args, **kwargs):
+        return HttpResponse('json')
+
+class SetupView(BaseView):
+    setups = 0
+    instances = 0
+
+    def __setup__(cls):
+        cls.setups += 1
+    __setup__ = classmethod(__setup__)
+
+    def __init__(self, request, *args, **kwargs):
+        SetupView.instances += 1
+
+    def __call__(self, request, *args, **kwargs):
+        return HttpResponse('%d/%d' % (self.setups, self.instances))
+
+class StatelessView(SetupView):
+    stateless = True
+    setups = 0
+
+class StatelessNegotiatingView(NegotiatingView):
+    stateless = True
+
+def export_etag(self, request, *args, **kwargs):
+    return 'v1'
+
+class ExportView(ctn.AbstractCTNView):
+    ctn_accept_binding = {'text/csv': 'csv', '*/*': 'csv'}
+    generated = 0
+
+    def rows(self):
+        for i in range(1000):
+            ExportView.generated += 1
+            yield u'%d,r\xf6w %d\n' % (i, i)
+
+    @ctn.ctn_cached(60, etag=export_etag)
+    def csv(self, request, *args, **kwargs):
+        if request.GET.get('buffered'):
+            return HttpResponse(''.join(self.rows()), mimetype='text/csv')
+        return HttpResponse(self.rows(), mimetype='text/csv')
+
+    def __filter__(self, response, chunks):
+        count = 0
+        yield 'id,name\n'
+        for chunk in chunks:
+            assert isinstance(chunk, str)
+            count += 1
+            yield chunk
+        yield '# %d\n' % count
+
+class StatelessExportView(ExportView):
+    stateless = True
+
+class MissingView(BaseView):
+    def __call__(self, request, *args, **kwargs):
+        return HttpResponseNotFound('missing')
+
+    def __filter__(self, response, chunks):
+        for chunk in chunks:
+            yield chunk
+        yield ' (filtered)'
+
+class FilteredMissingView(MissingView):
+    filter_errors = True
+
+def setup():
+    instrumentation.collector.reset()
+    instrumentation.enable()
+
+def teardown():
+    instrumentation.disable()
+    instrumentation.collector.reset()
+
+def testPhases():
+    view = create_view(PlainView)
+    for i in range(3):
+        assert view(utils.RequestFactory().get('/')).content == 'plain'
+    data = instrumentation.collector.snapshot()['tests.test_oopviews.PlainView']
+    assert sorted(data['phases']) == ['after', 'call', 'init', 'total']
+    for phase in data['phases'].values():
+        assert phase['count'] == 3
+        assert 0 <= phase['min'] <= phase['p50'] <= phase['max']
+    total = data['phases']['total']
+    assert total['total'] >= data['phases']['call']['total']
+    assert data['handlers'] == {}
+
+def testFailure():
+    view = create_view(FailingView)
+    try:
+        view(utils.RequestFactory().get('/'))
+    except ValueError:
+        pass
+    else:
+        assert False
+    phases = instrumentation.collector.snapshot()[
+        'tests.test_oopviews.FailingView']['phases']
+    assert phases['call']['count'] == phases['total']['count'] == 1
+    assert 'after' not in phases
+
+def testHandlers():
+    view = create_view(NegotiatingView)
+    for accept in ('text/html', 'application/json', 'text/html', 'image/png'):
+        view(utils.RequestFactory().get('/', HTTP_ACCEPT=accept))
+    data = instrumentation.collector.snapshot()[
+        'tests.test_oopviews.NegotiatingView']
+    assert data['handlers'] == {'html': 2, 'json': 1}
+    assert data['phases']['total']['count'] == 4
+
+def testExportAndReset():
+    exported = []
+    instrumentation.collector.add_exporter(exported.append)
+    try:
+        create_view(PlainView)(utils.RequestFactory().get('/'))
+        data = instrumentation.collector.export(reset=True)
+    finally:
+        instrumentation.collector.remove_exporter(exported.append)
+    assert exported == [data]
+    assert 'tests.test_oopviews.PlainView' in data
+    assert instrumentation.collector.snapshot() == {}
+
+def testDisabled():
+    instrumentation.collector.reset()
+    instrumentation.disable()
+    try:
+        create_view(PlainView)(utils.RequestFactory().get('/'))
+    finally:
+        instrumentation.enable()
+    assert instrumentation.collector.snapshot() == {}
+
+def testHistogram():
+    histogram = instrumentation.Histogram()
+    for value in [0.001] * 90 + [0.1] * 10:
+        histogram.add(value)
+    assert histogram.percentile(0.5) == histogram.percentile(0.9) \
+        == instrumentation.BUCKETS[6]
+    assert histogram.percentile(0.99) == 0.1
+    assert histogram.as_dict()['count'] == 100
+    histogram = instrumentation.Histogram()
+    assert histogram.as_dict()['mean'] is None
+    histogram.add(0.0)
+    assert histogram.as_dict()['mean'] == 0.0
+
+def testSetup():
+    view = create_view(SetupView)
+    create_view(SetupView)
+    assert SetupView.setups == 1
+    assert SetupView.instances == 0
+    assert view(utils.RequestFactory().get('/')).content == '1/1'
+    assert view(utils.RequestFactory().get('/')).content == '1/2'
+
+def testStateless():
+    SetupView.instances = 0
+    view = create_view(StatelessView)
+    assert StatelessView.setups == 1
+    assert SetupView.instances == 1
+    for i in range(3):
+        assert view(utils.RequestFactory().get('/')).content == '1/1'
+
+def testStatelessNegotiation():
+    view = create_view(StatelessNegotiatingView)
+    for accept in ('text/html', 'application/json', 'text/html'):
+        request = utils.RequestFactory().get('/', HTTP_ACCEPT=accept)
+        assert view(request).content == request.ctn_handler
+
+def testStatelessDisabled():
+    SetupView.instances = 0
+    instrumentation.collector.reset()
+    instrumentation.disable()
+    try:
+        view = create_view(StatelessView)
+        for i in range(3):
+            assert view(utils.RequestFactory().get('/')).content == '1/1'
+        view = create_view(StatelessNegotiatingView)
+        for accept in ('text/html', 'application/json', 'image/png'):
+            request = utils.RequestFactory().get('/', HTTP_ACCEPT=accept)
+            response = view(request)
+            assert response['Vary'] == 'Accept'
+            if accept == 'image/png':
+                assert response.status_code == 406
+            else:
+                assert response.content == request.ctn_handler
+    finally:
+        instrumentation.enable()
+    assert SetupView.instances == 1
+    assert instrumentation.collector.snapshot() == {}
+
+def testStreamingFilter():
+    ExportView.generated = 0
+    response = create_view(ExportView)(utils.RequestFactory().get('/'))
+    assert is_streaming(response)
+    assert response['Cache-Control'] == 'max-age=60'
+    # Nothing has been generated before the response gets sent
+    assert ExportView.generated == 0
+    chunks = iter(response)
+    assert chunks.next() == 'id,name\n'
+    assert chunks.next() == '0,r\xc3\xb6w 0\n'
+    assert ExportView.generated == 1
+    chunks = list(chunks)
+    assert len(chunks) == 1000
+    assert chunks[-1] == '# 1000\n'
+
+def testStreamingClose():
+    ExportView.generated = 0
+    response = create_view(ExportView)(utils.RequestFactory().get('/'))
+    chunks = iter(response)
+    chunks.next()
+    chunks.next()
+    response.close()
+    assert list(chunks) == []
+    assert ExportView.generated == 1
+
+def testBufferedFilter():
+    from django.core.cache import cache
+    cache.clear()
+    view = create_view(ExportView)
+    for i in range(2):
+        response = view(utils.RequestFactory().get('/', {'buffered': '1'}))
+        assert not is_streaming(response)
+        assert response.content.startswith('id,name\n0,r\xc3\xb6w 0\n')
+        assert response.content.endswith('999\n# 1\n')
+
+def testFilterDisabled():
+    from django.core.cache import cache
+    instrumentation.collector.reset()
+    instrumentation.disable()
+    try:
+        for klass in (ExportView, StatelessExportView):
+            ExportView.generated = 0
+            view = create_view(klass)
+            response = view(utils.RequestFactory().get('/'))
+            assert is_streaming(response)
+            assert ExportView.generated == 0
+            chunks = list(response)
+            assert chunks[:2] == ['id,name\n', '0,r\xc3\xb6w 0\n']
+            assert chunks[-1] == '# 1000\n'
+            cache.clear()
+            response = view(utils.RequestFactory().get('/', {'buffered': '1'}))
+            assert not is_streaming(response)
+            assert response.content.startswith('id,name\n0,r\xc3\xb6w 0\n')
+            assert response.content.endswith('999\n# 1\n')
+            response = view(utils.RequestFactory().get('/',
+                HTTP_IF_NONE_MATCH='"v1-csv"'))
+            assert response.status_code == 304
+            assert response.content == ''
+    finally:
+        instrumentation.enable()
+    assert instrumentation.collector.snapshot() == {}
+
+def testFilterSkipsEmptyResponses():
+    ExportView.generated = 0
+    view = create_view(ExportView)
+    response = view(utils.RequestFactory().get('/',
+        HTTP_IF_NONE_MATCH='"v1-csv"'))
+    assert response.status_code == 304
+    assert response.content == ''
+    assert ExportView.generated == 0
+    response = view(utils.RequestFactory().head('/'))
+    assert response.status_code == 200
+    content = response.content
+    assert content.startswith('0,r\xc3\xb6w 0\n')
+    assert content.endswith('999,r\xc3\xb6w 999\n')
+
+def testFilterErrors():
+    request = utils.RequestFactory().get('/')
+    assert create_view(MissingView)(request).content == 'missing'
+    assert create_view(FilteredMissingView)(request).content == \
+        'missing (filtered)'
@@ -0,0 +1,142 @@
+"""
+Test module for the paginators and the pagination template tags
+"""
+from __future__ import with_statement
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Paginator
+from django.template import Context, Template
+from django.template.loader import render_to_string
+from django.test import TestCase
+
+from django_zsutils.templatetags.zsutils import pagination
+from django_zsutils.utils.paginator import KeysetPaginator, InvalidCursor, \
+    CachedCountPaginator
+from .models import Article
+from .utils import RequestFactory
+
+class KeysetPaginatorTest(TestCase):
+
+    def setUp(self):
+        for i in range(7):
+            Article.objects.create(title='Article %d' % (i % 3))
+
+    def _ids(self, page):
+        return [article.pk for article in page]
+
+    def testNavigation(self):
+        paginator = KeysetPaginator(Article.objects.all(), 3,
+            ordering=('-title', ))
+        page1 = paginator.page()
+        self.assertEqual(self._ids(page1), [3, 6, 2])
+        self.assertFalse(page1.has_previous())
+        page2 = paginator.page(page1.next_cursor())
+        self.assertEqual(self._ids(page2), [5, 1, 4])
+        page3 = paginator.page(page2.next_cursor())
+        self.assertEqual(self._ids(page3), [7])
+        self.assertFalse(page3.has_next())
+        back = paginator.page(page3.previous_cursor())
+        self.assertEqual(self._ids(back), [5, 1, 4])
+        back = paginator.page(back.previous_cursor())
+        self.assertEqual(self._ids(back), [3, 6, 2])
+        self.assertFalse(back.has_previous())
+
+    def testInvalidCursor(self):
+        paginator = KeysetPaginator(Article.objects.all(), 3)
+        self.assertRaises(InvalidCursor, paginator.page, 'garbage')
+
+    def testTag(self):
+        paginator = KeysetPaginator(Article.objects.all(), 3)
+        page = paginator.page(paginator.page().next_cursor())
+        output = render_to_string('keyset_pagination.html',
+            pagination.keyset_pagination(Context({'page': page})))
+        self.assertTrue('href="?cursor=%s"' % page.next_cursor() in output)
+        self.assertTrue('href="?cursor=%s"' % page.previous_cursor()
+            in output)
+
+class CachedCountPaginatorTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        for i in range(7):
+            Article.objects.create(title='Article %d' % i)
+
+    def testCachedCount(self):
+        qs = Article.objects.filter(title__startswith='Article')
+        self.assertEqual(CachedCountPaginator(qs, 3).num_pages, 3)
+        Article.objects.create(title='Article 7')
+        with self.assertNumQueries(0):
+            paginator = CachedCountPaginator(qs, 3)
+            self.assertEqual(paginator.count, 7)
+        self.assertFalse(paginator.count_is_estimate)
+        # A different query has its own count
+        paginator = CachedCountPaginator(qs.filter(id__gt=1), 3)
+        self.assertEqual(paginator.count, 7)
+
+    def testEstimateUnavailable(self):
+        paginator = CachedCountPaginator(Article.objects.all(), 3,
+            estimate_threshold=1)
+        self.assertEqual(paginator.count, 7)
+        self.assertFalse(paginator.count_is_estimate)
+
+    def testLowEstimate(self):
+        paginator = CachedCountPaginator(Article.objects.all(), 3,
+            estimate_threshold=1)
+        paginator._estimate_count = lambda *args: 2
+        self.assertEqual(paginator.num_pages, 1)
+        self.assertTrue(paginator.count_is_estimate)
+        page = paginator.page(1)
+        self.assertTrue(page.has_next())
+        with self.assertNumQueries(1):
+            page = paginator.page(3)
+        self.assertEqual([a.title for a in page.object_list], ['Article 6'])
+        self.assertFalse(page.has_next())
+        self.assertEqual((page.start_index(), page.end_index()), (7, 7))
+        self.assertRaises(EmptyPage, paginator.page, 4)
+        output = render_to_string('pagination.html',
+            pagination.pagination(Context({'page': paginator.page(2)})))
+        self.assertTrue('Page 2 of about 3' in output)
+        self.assertTrue('href="?p=3"' in output)
+
+    def testEstimateInTag(self):
+        paginator = CachedCountPaginator(Article.objects.all(), 3)
+        paginator.count
+        paginator.count_is_estimate = True
+        context = pagination.pagination(Context({'page': paginator.page(1)}))
+        self.assertFalse(context['show_last'])
+        output = render_to_string('pagination.html', context)
+        self.assertTrue('Page 1 of about 3' in output)
+
+class PaginationTagTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.request = RequestFactory().get('/', {'q': 'term', 'p': '3'})
+
+    def testDeepPage(self):
+        page = Paginator(range(10 ** 6), 1).page(500000)
+        context = pagination.pagination(Context({'page': page}))
+        self.assertEqual(context['previous_pages'], range(499996, 500000))
+        self.assertEqual(context['next_pages'], range(500001, 500006))
+
+    def testQueryParameters(self):
+        page = Paginator(range(50), 10).page(3)
+        context = pagination.pagination(Context({'page': page,
+            'request': self.request}))
+        self.assertEqual(context['page_url'], '?q=term&p=')
+
+    def testFragmentCache(self):
+        node = pagination.PaginationNode('pagination.html')
+        page = Paginator(range(50), 10).page(3)
+        settings.PAGINATION_CACHE_TIMEOUT = 60
+        try:
+            output = node.render(Context({'page': page,
+                'request': self.request}))
+            self.assertTrue('href="?q=term&amp;p=4"' in output)
+            # The second rendering has to come from the cache
+            node.template = Template('changed')
+            self.assertEqual(node.render(Context({'page': page,
+                'request': self.request})), output)
+        finally:
+            del settings.PAGINATION_CACHE_TIMEOUT
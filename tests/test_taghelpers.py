@@ -0,0 +1,69 @@
+"""
+Test module for the zsutils.taghelpers template tags
+"""
+from __future__ import with_statement
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.urlresolvers import set_script_prefix, set_urlconf
+from django.template import Context
+from django.test import TestCase
+
+from django_zsutils.templatetags.zsutils import taghelpers
+from .models import Entry, Photo
+
+class ObjectTagsTest(TestCase):
+
+    def setUp(self):
+        self.entries = [Entry.objects.create(title='Entry %d' % i,
+            tags='common tag%d' % i) for i in range(5)]
+
+    def testRender(self):
+        node = taghelpers.TagsForObjectNode('object.tags', 'blog-tag')
+        output = node.render(Context({'object': self.entries[0]}))
+        self.assertEqual(output, '<a href="/blog/tags/common/" rel="tag">'
+            'common</a> and <a href="/blog/tags/tag0/" rel="tag">tag0</a>')
+
+    def testLinkCache(self):
+        cache = taghelpers.get_link_cache()
+        taghelpers.clear_link_cache()
+        cache.reset_stats()
+        node = taghelpers.TagsForObjectNode('tags', 'blog-tag')
+        context = Context({'tags': 'one two'})
+        self.assertEqual(node.render(context), node.render(context))
+        self.assertEqual(len(cache), 2)
+        self.assertEqual((cache.stats()['hits'], cache.stats()['misses']),
+            (2, 2))
+        try:
+            set_script_prefix('/app/')
+            self.assertTrue(node.render(context).startswith(
+                '<a href="/app/blog/tags/one/"'))
+            set_script_prefix('/')
+            set_urlconf('tests.other_urls')
+            self.assertTrue(node.render(context).startswith(
+                '<a href="/tags/one/"'))
+        finally:
+            set_script_prefix('/')
+            set_urlconf(None)
+        self.assertEqual(len(cache), 6)
+        taghelpers.clear_link_cache()
+        self.assertEqual(len(cache), 0)
+        self.assertTrue(node.render(context).startswith(
+            '<a href="/blog/tags/one/"'))
+
+    def testPrefetch(self):
+        photo = Photo.objects.create(title='Photo')
+        # Don't count the query filling the content type cache
+        ContentType.objects.get_for_model(Photo)
+        with self.assertNumQueries(2):
+            objects = taghelpers.prefetch_tags(
+                list(Entry.objects.all()) + [photo])
+        node = taghelpers.TagsForObjectNode('object', 'blog-tag', '", "',
+            '" & "')
+        field_node = taghelpers.TagsForObjectNode('object.tags', 'blog-tag')
+        with self.assertNumQueries(0):
+            outputs = [node.render(Context({'object': obj}))
+                for obj in objects]
+            field_node.render(Context({'object': objects[0]}))
+        self.assertTrue(outputs[4].endswith('common</a> & <a href='
+            '"/blog/tags/tag4/" rel="tag">tag4</a>'))
+        self.assertEqual(outputs[5], '')